@@ -0,0 +1,29 @@
+"""Task listing indexes
+
+Revision ID: 9b2e4f1c7a53
+Revises: d650d6262436
+Create Date: 2026-10-18 12:10:04.512733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9b2e4f1c7a53'
+down_revision: Union[str, None] = 'd650d6262436'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_owner_id_created_at_id', 'tasks', ['owner_id', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_subtasks_parent_id'), 'subtasks', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_subtasks_parent_id'), table_name='subtasks')
+    op.drop_index('ix_tasks_owner_id_created_at_id', table_name='tasks')
@@ -0,0 +1,59 @@
+"""Task subtask counters
+
+Revision ID: c0b268449c40
+Revises: 9b2e4f1c7a53
+Create Date: 2026-10-18 14:00:21.305817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c0b268449c40'
+down_revision: Union[str, None] = '9b2e4f1c7a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = 5000
+
+# пересчёт счётчиков для следующей пачки задач по возрастанию id
+BACKFILL_CHUNK = sa.text("""
+WITH chunk AS (
+    SELECT id FROM tasks WHERE id > :last_id ORDER BY id LIMIT :limit
+), counts AS (
+    SELECT chunk.id,
+           count(subtasks.id) AS total,
+           count(subtasks.id) FILTER (WHERE subtasks.is_completed) AS completed
+    FROM chunk LEFT JOIN subtasks ON subtasks.parent_id = chunk.id
+    GROUP BY chunk.id
+), updated AS (
+    UPDATE tasks
+    SET subtask_count = counts.total, completed_subtask_count = counts.completed
+    FROM counts
+    WHERE tasks.id = counts.id AND (counts.total > 0 OR counts.completed > 0)
+)
+SELECT id FROM chunk ORDER BY id DESC LIMIT 1
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('subtask_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('tasks', sa.Column('completed_subtask_count', sa.Integer(), server_default='0', nullable=False))
+    # заполнение пачками, каждая в своей транзакции: блокировки строк снимаются
+    # после каждой пачки, а не держатся до конца миграции
+    connection = op.get_bind()
+    last_id = '00000000-0000-0000-0000-000000000000'
+    with op.get_context().autocommit_block():
+        while last_id is not None:
+            last_id = connection.execute(
+                BACKFILL_CHUNK, {'last_id': last_id, 'limit': BACKFILL_CHUNK_SIZE}
+            ).scalar()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'completed_subtask_count')
+    op.drop_column('tasks', 'subtask_count')
@@ -0,0 +1,29 @@
+"""Open task deadline indexes
+
+Revision ID: ae2b26ff989f
+Revises: c0b268449c40
+Create Date: 2026-10-18 15:00:42.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'ae2b26ff989f'
+down_revision: Union[str, None] = 'c0b268449c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_owner_id_deadline_open', 'tasks', ['owner_id', 'deadline'], unique=False, postgresql_where=sa.text('NOT is_completed AND deadline IS NOT NULL'))
+    op.create_index('ix_tasks_deadline_id_open', 'tasks', ['deadline', 'id'], unique=False, postgresql_where=sa.text('NOT is_completed AND deadline IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_deadline_id_open', table_name='tasks', postgresql_where=sa.text('NOT is_completed AND deadline IS NOT NULL'))
+    op.drop_index('ix_tasks_owner_id_deadline_open', table_name='tasks', postgresql_where=sa.text('NOT is_completed AND deadline IS NOT NULL'))
@@ -0,0 +1,35 @@
+"""Task full text search
+
+Revision ID: f1134f326705
+Revises: ae2b26ff989f
+Create Date: 2026-10-18 16:00:09.842671
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'f1134f326705'
+down_revision: Union[str, None] = 'ae2b26ff989f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # добавление STORED колонки переписывает таблицу, на больших данных - в окно обслуживания
+    op.add_column('tasks', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('russian', name), 'A') || setweight(to_tsvector('russian', coalesce(description, '')), 'B')", persisted=True), nullable=True))
+    op.add_column('subtasks', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('russian', name)", persisted=True), nullable=True))
+    op.create_index('ix_tasks_search_vector', 'tasks', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_subtasks_search_vector', 'subtasks', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_subtasks_search_vector', table_name='subtasks', postgresql_using='gin')
+    op.drop_index('ix_tasks_search_vector', table_name='tasks', postgresql_using='gin')
+    op.drop_column('subtasks', 'search_vector')
+    op.drop_column('tasks', 'search_vector')
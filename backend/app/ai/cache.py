@@ -0,0 +1,93 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from redis_client import get_redis
+
+
+def normalize_name(name: str) -> str:
+    """Приведение названия задачи к виду, в котором совпадают одинаковые по смыслу названия"""
+    name = unicodedata.normalize("NFKC", name).casefold().replace("ё", "е")
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
+
+
+class SuggestionCache:
+    """
+    Двухуровневый кеш подсказок подзадач: LRU в памяти процесса и redis.
+    Ключ - нормализованное название задачи и версия модели, поэтому после
+    смены модели старые записи перестают читаться и истекают по TTL.
+    """
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.model_version = ""
+        self._entries: OrderedDict[str, list[str]] = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def set_model_version(self, version: str) -> None:
+        if version != self.model_version:
+            self.model_version = version
+            self._entries.clear()
+
+    def _key(self, name: str) -> str:
+        digest = hashlib.sha1(normalize_name(name).encode()).hexdigest()
+        return f"suggest:{self.model_version}:{digest}"
+
+    def _remember(self, key: str, subtasks: list[str]) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = subtasks
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, name: str) -> list[str] | None:
+        key = self._key(name)
+        subtasks = self._entries.get(key)
+        if subtasks is not None:
+            self._entries.move_to_end(key)
+            self.local_hits += 1
+            return subtasks
+        try:
+            redis = await get_redis()
+            raw = await redis.get(key)
+        except RedisError:
+            self.errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        subtasks = json.loads(raw)
+        self._remember(key, subtasks)
+        self.redis_hits += 1
+        return subtasks
+
+    async def put(self, name: str, subtasks: list[str]) -> None:
+        key = self._key(name)
+        self._remember(key, subtasks)
+        try:
+            redis = await get_redis()
+            await redis.set(key, json.dumps(subtasks, ensure_ascii=False), ex=self.ttl)
+        except RedisError:
+            self.errors += 1
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            "size": len(self._entries),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
@@ -0,0 +1,203 @@
+import json
+import time
+from config import JobsConfig, settings
+from metrics import register_collector
+from redis_client import get_redis
+
+
+# KEYS[1] - хеш задания, KEYS[2] - очередь
+# ARGV[1] - айди задания, ARGV[2] - название задачи, ARGV[3] - владелец, ARGV[4] - время жизни, ARGV[5] - текущее время
+ENQUEUE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', 'pending', 'name', ARGV[2], 'owner_id', ARGV[3],
+    'attempts', 0, 'updated_at', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('LPUSH', KEYS[2], ARGV[1])
+return 1
+"""
+
+# KEYS[1] - очередь, KEYS[2] - задания в работе, KEYS[3] - отложенные, KEYS[4] - аренды
+# ARGV[1] - текущее время, ARGV[2] - размер пачки, ARGV[3] - срок аренды в секундах
+# Возвращает отложенные задания, время которых пришло, и задания упавших воркеров
+# с истёкшей арендой в очередь, затем забирает из очереди до ARGV[2] заданий.
+POP_BATCH = """
+local now = tonumber(ARGV[1])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now, 'LIMIT', 0, 1000)) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now, 'LIMIT', 0, 1000)) do
+    redis.call('ZREM', KEYS[4], id)
+    redis.call('LREM', KEYS[2], 0, id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+local ids = {}
+for i = 1, tonumber(ARGV[2]) do
+    local id = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+    if not id then
+        break
+    end
+    redis.call('ZADD', KEYS[4], now + tonumber(ARGV[3]), id)
+    table.insert(ids, id)
+end
+return ids
+"""
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class SubtaskJobQueue:
+    """
+    Очередь заданий на генерацию подзадач в redis.
+    Айди задания - айди задачи, он же ключ идемпотентности: повторная постановка
+    той же задачи ничего не делает. Задание в работе держит аренду, и если воркер
+    упал, по её истечении задание вернётся в очередь. Неудачные попытки
+    откладываются с экспоненциальной задержкой до max_attempts.
+    """
+    def __init__(self, config: JobsConfig, prefix: str = "jobs:subtasks"):
+        self.config = config
+        self.queue_key = f"{prefix}:queue"
+        self.processing_key = f"{prefix}:processing"
+        self.delayed_key = f"{prefix}:delayed"
+        self.leases_key = f"{prefix}:leases"
+        self.prefix = prefix
+
+    def job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def channel(self, job_id: str) -> str:
+        return f"{self.prefix}:events:{job_id}"
+
+    async def enqueue(self, job_id: str, name: str, owner_id: str) -> bool:
+        """Постановка задания в очередь, False если задание с таким айди уже есть"""
+        redis = await get_redis()
+        enqueue = redis.register_script(ENQUEUE)
+        created = await enqueue(
+            keys=[self.job_key(job_id), self.queue_key],
+            args=[job_id, name, owner_id, self.config.result_ttl, time.time()],
+        )
+        return created == 1
+
+    async def pop_batch(self, size: int) -> list[dict]:
+        """Забирает до size заданий в работу вместе с их данными"""
+        redis = await get_redis()
+        pop = redis.register_script(POP_BATCH)
+        ids = await pop(
+            keys=[self.queue_key, self.processing_key, self.delayed_key, self.leases_key],
+            args=[time.time(), size, self.config.lease_timeout],
+        )
+        if not ids:
+            return []
+        async with redis.pipeline(transaction=False) as pipe:
+            for job_id in ids:
+                pipe.hset(self.job_key(job_id), mapping={"status": "running", "updated_at": time.time()})
+                pipe.expire(self.job_key(job_id), self.config.result_ttl)
+                pipe.hgetall(self.job_key(job_id))
+            results = await pipe.execute()
+        return [{**job, "id": job_id} for job_id, job in zip(ids, results[2::3])]
+
+    async def complete(self, results: dict[str, list[str]]) -> None:
+        """Отметка успешных заданий и оповещение подписчиков одним пайплайном"""
+        redis = await get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            for job_id, subtasks in results.items():
+                # в хеше подзадачи хранятся json строкой, подписчикам уходят списком, как из get()
+                status = {"status": "done", "subtasks": subtasks}
+                pipe.hset(
+                    self.job_key(job_id),
+                    mapping={
+                        "status": "done",
+                        "subtasks": json.dumps(subtasks, ensure_ascii=False),
+                        "updated_at": time.time(),
+                    },
+                )
+                pipe.expire(self.job_key(job_id), self.config.result_ttl)
+                pipe.zrem(self.leases_key, job_id)
+                pipe.lrem(self.processing_key, 0, job_id)
+                pipe.publish(self.channel(job_id), json.dumps(status, ensure_ascii=False))
+            await pipe.execute()
+
+    async def fail(self, jobs: list[dict], error: str) -> None:
+        """Неудачная попытка: откладывание с экспоненциальной задержкой или окончательная ошибка"""
+        redis = await get_redis()
+        now = time.time()
+        async with redis.pipeline(transaction=True) as pipe:
+            for job in jobs:
+                job_id = job["id"]
+                attempts = int(job.get("attempts", 0)) + 1
+                pipe.zrem(self.leases_key, job_id)
+                pipe.lrem(self.processing_key, 0, job_id)
+                if attempts < self.config.max_attempts:
+                    delay = min(
+                        self.config.backoff_base_ms * 2 ** (attempts - 1),
+                        self.config.backoff_max_ms,
+                    ) / 1000
+                    status = {"status": "retrying", "attempts": attempts, "error": error}
+                    pipe.zadd(self.delayed_key, {job_id: now + delay})
+                else:
+                    status = {"status": "failed", "attempts": attempts, "error": error}
+                    pipe.publish(self.channel(job_id), json.dumps(status))
+                pipe.hset(self.job_key(job_id), mapping={**status, "updated_at": now})
+                pipe.expire(self.job_key(job_id), self.config.result_ttl)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> dict | None:
+        redis = await get_redis()
+        job = await redis.hgetall(self.job_key(job_id))
+        if not job:
+            return None
+        if "subtasks" in job:
+            job["subtasks"] = json.loads(job["subtasks"])
+        return job
+
+    async def depth(self) -> dict[str, int]:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.queue_key)
+            pipe.llen(self.processing_key)
+            pipe.zcard(self.delayed_key)
+            queued, processing, delayed = await pipe.execute()
+        return {"queued": queued, "processing": processing, "delayed": delayed}
+
+
+class EventStreams:
+    """
+    Учёт открытых подписок на события заданий в процессе: всего и по юзерам.
+    Подписка pubsub занимает соединение из пула redis до своего конца, и без
+    ограничения простаивающие подписчики выбрали бы весь пул.
+    """
+    def __init__(self, config: JobsConfig):
+        self.config = config
+        self._per_user: dict[str, int] = {}
+        self.open = 0
+        self.rejected = 0
+
+    def has_room(self, user_id: str) -> bool:
+        return (
+            self.open < self.config.events_max_streams
+            and self._per_user.get(user_id, 0) < self.config.events_max_per_user
+        )
+
+    def acquire(self, user_id: str) -> bool:
+        if not self.has_room(user_id):
+            self.rejected += 1
+            return False
+        self.open += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        return True
+
+    def release(self, user_id: str) -> None:
+        self.open -= 1
+        self._per_user[user_id] -= 1
+        if not self._per_user[user_id]:
+            del self._per_user[user_id]
+
+    def stats(self) -> dict[str, int]:
+        return {"open": self.open, "rejected": self.rejected}
+
+
+subtask_jobs = SubtaskJobQueue(settings.jobs)
+job_event_streams = EventStreams(settings.jobs)
+register_collector("subtask_job_streams", job_event_streams.stats)
@@ -0,0 +1,193 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+from config import AIConfig
+
+
+def parse_subtasks(text: str, separator: str, limit: int) -> list[str]:
+    """Разбор сгенерированного текста в список уникальных подзадач"""
+    subtasks = []
+    for part in text.split(separator):
+        name = part.strip()
+        if name and name not in subtasks:
+            subtasks.append(name)
+    return subtasks[:limit]
+
+
+class SubtaskStreamer:
+    """
+    Стример для model.generate: по мере декодирования токенов отдаёт каждую
+    подзадачу, как только после неё сгенерирован разделитель.
+    """
+    def __init__(
+        self,
+        tokenizer,
+        separator: str,
+        limit: int,
+        on_subtask: Callable[[str], None],
+        cancelled: threading.Event,
+    ):
+        self.tokenizer = tokenizer
+        self.separator = separator
+        self.limit = limit
+        self.on_subtask = on_subtask
+        self.cancelled = cancelled
+        self.token_ids: list[int] = []
+        self.emitted: list[str] = []
+        self.completed_parts = 0
+        self.is_prompt = True
+
+    def _emit(self, name: str) -> None:
+        name = name.strip()
+        if not name or name in self.emitted or len(self.emitted) >= self.limit:
+            return
+        self.emitted.append(name)
+        self.on_subtask(name)
+        if len(self.emitted) >= self.limit:
+            self.cancelled.set()
+
+    def put(self, value) -> None:
+        # первым приходит стартовый токен декодера, он не часть ответа
+        if self.is_prompt:
+            self.is_prompt = False
+            return
+        self.token_ids.extend(value.reshape(-1).tolist())
+        text = self.tokenizer.decode(self.token_ids, skip_special_tokens=True)
+        # последняя часть ещё может дописываться, отдаются только завершённые
+        parts = text.split(self.separator)[:-1]
+        for part in parts[self.completed_parts:]:
+            self._emit(part)
+        self.completed_parts = len(parts)
+
+    def end(self) -> None:
+        text = self.tokenizer.decode(self.token_ids, skip_special_tokens=True)
+        for part in text.split(self.separator)[self.completed_parts:]:
+            self._emit(part)
+
+
+class SubtaskModel:
+    """
+    Обёртка над fine-tuned flan/T5 моделью для инференса на CPU.
+    torch и transformers импортируются только при загрузке, без них
+    остальное приложение работает, а подсказки подзадач недоступны.
+    """
+    def __init__(self, config: AIConfig):
+        self.config = config
+        self.tokenizer = None
+        self.model = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    @property
+    def version(self) -> str:
+        """
+        Версия модели для ключей кеша. Если она не задана в конфиге, считается
+        по пути к модели, времени изменения её файлов и параметрам генерации.
+        """
+        if self.config.model_version:
+            return self.config.model_version
+        path = Path(self.config.model_path)
+        mtime = max((file.stat().st_mtime for file in path.glob("*")), default=0) if path.is_dir() else 0
+        source = "|".join(
+            str(value)
+            for value in (
+                self.config.model_path,
+                mtime,
+                self.config.backend,
+                self.config.quantize,
+                self.config.input_prefix,
+                self.config.separator,
+                self.config.num_beams,
+                self.config.max_new_tokens,
+                self.config.max_subtasks,
+            )
+        )
+        return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+    def load(self) -> None:
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+        torch.set_num_threads(self.config.num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.config.model_path)
+        if self.config.backend == "onnx":
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(self.config.model_path)
+            return
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.config.model_path)
+        model.eval()
+        if self.config.quantize:
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.model = model
+
+    def predict(self, names: list[str]) -> list[list[str]]:
+        """Генерация подзадач для пачки названий за один проход модели"""
+        import torch
+
+        inputs = self.tokenizer(
+            [self.config.input_prefix + name for name in names],
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.config.max_input_tokens,
+        )
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                num_beams=self.config.num_beams,
+                max_new_tokens=self.config.max_new_tokens,
+            )
+        texts = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        return [
+            parse_subtasks(text, self.config.separator, self.config.max_subtasks)
+            for text in texts
+        ]
+
+    def stream(
+        self,
+        name: str,
+        on_subtask: Callable[[str], None],
+        cancelled: threading.Event,
+    ) -> None:
+        """
+        Генерация подзадач для одной задачи с выдачей каждой подзадачи сразу после декодирования.
+        Beam search знает ответ только в конце, поэтому здесь используется жадное декодирование.
+        Генерация останавливается на ближайшем токене, как только выставлен cancelled.
+        """
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        class Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool)
+
+        if cancelled.is_set():
+            return
+        inputs = self.tokenizer(
+            [self.config.input_prefix + name],
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.config.max_input_tokens,
+        )
+        streamer = SubtaskStreamer(
+            self.tokenizer,
+            self.config.separator,
+            self.config.max_subtasks,
+            on_subtask,
+            cancelled,
+        )
+        with torch.inference_mode():
+            self.model.generate(
+                **inputs,
+                num_beams=1,
+                do_sample=False,
+                max_new_tokens=self.config.max_new_tokens,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([Cancelled()]),
+            )
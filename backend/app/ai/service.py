@@ -0,0 +1,213 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from fastapi import HTTPException
+from config import AIConfig, settings
+from metrics import register_collector
+from ai.model import SubtaskModel
+from ai.cache import SuggestionCache, normalize_name
+
+
+class SuggestionService:
+    """
+    Сервис подсказок подзадач с динамическим батчингом.
+    Запросы складываются в asyncio очередь, фоновый цикл собирает их в пачку
+    до max_batch_size штук или до истечения max_wait_ms с первого запроса и
+    прогоняет пачку через модель в отдельном потоке, не блокируя event loop.
+    Готовые подсказки кешируются, повторяющиеся названия модель не вызывают.
+    """
+    def __init__(self, config: AIConfig):
+        self.config = config
+        self.model = SubtaskModel(config)
+        self.cache = SuggestionCache(max_size=config.cache_size, ttl=config.cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="subtask-model")
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self.requests = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.rejected = 0
+        self.failures = 0
+        self.streams = 0
+        self.cancelled_streams = 0
+        self.load_failures = 0
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.config.model_path is not None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model.is_loaded and self._worker is not None
+
+    async def start(self) -> None:
+        """
+        Загрузка модели (один раз на воркер) и запуск цикла батчинга.
+        Если модель не загрузилась (нет torch/transformers или чекпоинта),
+        приложение всё равно запускается, а подсказки отвечают 503.
+        """
+        if not self.is_enabled:
+            return
+        if not self.model.is_loaded:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self.model.load)
+            except Exception as e:
+                self.load_failures += 1
+                print(f"Subtask model failed to load, suggestions are disabled: {e!r}")
+                return
+        self.cache.set_model_version(self.model.version)
+        self._queue = asyncio.Queue(maxsize=self.config.max_queue_size)
+        self._worker = asyncio.create_task(self._batch_loop())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def swap_model(self, config: AIConfig) -> None:
+        """Загрузка другой модели на лету, кеш старой модели перестаёт использоваться"""
+        model = SubtaskModel(config)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, model.load)
+        self.config = config
+        self.model = model
+        self.cache.set_model_version(model.version)
+
+    async def suggest(self, name: str) -> list[str]:
+        """Подзадачи для одной задачи: из кеша или из ближайшей пачки модели"""
+        if not self.is_ready:
+            raise HTTPException(status_code=503, detail="Subtask suggestions are unavailable")
+        cached = await self.cache.get(name)
+        if cached is not None:
+            return cached
+        subtasks = await self._predict(name)
+        await self.cache.put(name, subtasks)
+        return subtasks
+
+    async def stream(self, name: str) -> AsyncIterator[str]:
+        """
+        Подзадачи для одной задачи по одной, по мере генерации.
+        Если итерацию прервали (например, клиент отключился), генерация
+        останавливается и поток модели освобождается для других запросов.
+        """
+        if not self.is_ready:
+            raise HTTPException(status_code=503, detail="Subtask suggestions are unavailable")
+        cached = await self.cache.get(name)
+        if cached is not None:
+            for subtask in cached:
+                yield subtask
+            return
+        self.streams += 1
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def emit(item) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def generate() -> None:
+            try:
+                self.model.stream(name, emit, cancelled)
+            finally:
+                emit(done)
+
+        # результат жадного декодирования в кеш не пишется: он может отличаться от beam search
+        generation = loop.run_in_executor(self._executor, generate)
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            try:
+                await generation
+            except Exception as e:
+                self.failures += 1
+                raise HTTPException(status_code=500, detail=f"Subtask prediction failed: {e}")
+            finished = True
+        finally:
+            if not finished:
+                self.cancelled_streams += 1
+            cancelled.set()
+
+    async def _predict(self, name: str) -> list[str]:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((name, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, try again later")
+        self.requests += 1
+        return await future
+
+    async def _collect_batch(self) -> list[tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.config.max_wait_ms / 1000
+        while len(batch) < self.config.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except TimeoutError:
+                break
+        # запросы, клиенты которых уже ушли, не занимают место в пачке
+        return [(name, future) for name, future in batch if not future.done()]
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+            # одинаковые после нормализации названия в пачке считаются один раз
+            names: dict[str, str] = {}
+            for name, _ in batch:
+                names.setdefault(normalize_name(name), name)
+            try:
+                predicted = await loop.run_in_executor(
+                    self._executor, self.model.predict, list(names.values())
+                )
+                results = dict(zip(names.keys(), predicted))
+            except Exception as e:
+                self.failures += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(
+                            HTTPException(status_code=500, detail=f"Subtask prediction failed: {e}")
+                        )
+                continue
+            self.batches += 1
+            self.batched_items += len(batch)
+            for name, future in batch:
+                if not future.done():
+                    future.set_result(results[normalize_name(name)])
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "ready": int(self.is_ready),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "streams": self.streams,
+            "cancelled_streams": self.cancelled_streams,
+            "load_failures": self.load_failures,
+        }
+
+
+suggestion_service = SuggestionService(settings.ai)
+register_collector("subtask_suggestions", suggestion_service.stats)
+register_collector("subtask_suggestion_cache", suggestion_service.cache.stats)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import collect, render_prometheus
+
+
+router = APIRouter(prefix="/v1/metrics")
+prometheus_router = APIRouter()
+
+
+@router.get("", tags=["metrics"])
+async def get_metrics():
+    return collect()
+
+
+@prometheus_router.get("/metrics", tags=["metrics"], response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
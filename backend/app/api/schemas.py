@@ -1,6 +1,6 @@
-from typing import List
+from typing import Annotated, List, Literal, Union
 import uuid
-from pydantic import BaseModel, EmailStr, Field, SecretStr, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, SecretStr, field_validator
 from datetime import datetime, timezone
 
 
@@ -82,6 +82,7 @@ class TaskPOST(BaseModel):
     is_public: bool = Field(default=True)
     owner_id: uuid.UUID
     subtasks: List[SubTaskPOST] = []
+    generate_subtasks: bool = False
 
     @field_validator("deadline")
     @classmethod
@@ -105,4 +106,113 @@ class TaskPatch(BaseModel):
 
 class SubTaskPostToMain(BaseModel):
     subtasks: List[SubTaskPOST]
-    main_task_id: uuid.UUID
\ No newline at end of file
+    main_task_id: uuid.UUID
+
+
+class SubTaskRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    name: str
+    is_completed: bool
+    parent_id: uuid.UUID | None
+    created_at: datetime
+    updated_at: datetime
+
+
+class TaskRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    name: str
+    description: str | None
+    deadline: datetime | None
+    is_public: bool
+    is_completed: bool
+    owner_id: uuid.UUID
+    created_at: datetime
+    updated_at: datetime
+    subtask_count: int
+    completed_subtask_count: int
+
+
+class TaskDetailRead(TaskRead):
+    subtasks: List[SubTaskRead]
+
+
+class TaskCreated(TaskDetailRead):
+    subtask_job: dict | None = None
+
+
+class TaskPage(BaseModel):
+    items: List[TaskRead]
+    next_cursor: str | None
+
+
+class TaskSearchHit(TaskRead):
+    search_rank: float
+
+
+class TaskSearchPage(BaseModel):
+    items: List[TaskSearchHit]
+    next_cursor: str | None
+
+
+class DueTasks(BaseModel):
+    overdue: List[TaskRead]
+    upcoming: List[TaskRead]
+
+
+class UserRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    email: EmailStr
+    name: str
+    last_name: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class UserPublicRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    name: str
+    last_name: str
+    created_at: datetime
+    task_count: int | None = None
+
+
+class SubtaskSuggestionRequest(BaseModel):
+    name: str = Field(min_length=2, max_length=80)
+
+
+class BulkTaskCreate(TaskPOST):
+    op: Literal["create"]
+    owner_id: uuid.UUID | None = None
+
+
+class BulkTaskPatch(TaskPatch):
+    op: Literal["patch"]
+
+
+class BulkTaskDelete(BaseModel):
+    op: Literal["delete"]
+    id: uuid.UUID
+
+
+class BulkSubTaskToggle(BaseModel):
+    op: Literal["toggle_subtask"]
+    id: uuid.UUID
+    is_completed: bool
+
+
+BulkOperation = Annotated[
+    Union[BulkTaskCreate, BulkTaskPatch, BulkTaskDelete, BulkSubTaskToggle],
+    Field(discriminator="op"),
+]
+
+
+class BulkTaskOperations(BaseModel):
+    operations: List[BulkOperation] = Field(min_length=1, max_length=1000)
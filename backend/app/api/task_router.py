@@ -1,117 +1,663 @@
-from fastapi import APIRouter, HTTPException, Depends
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    Boolean,
+    String,
+    Uuid,
+    case,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
+from sqlalchemy.orm import with_expression
+from auth import api_key_header, read_session, write_session
+from config import settings
+from api.schemas import (
+    TaskPOST,
+    SubTaskPOST,
+    TaskPatch,
+    SubTaskPostToMain,
+    BulkTaskOperations,
+    SubtaskSuggestionRequest,
+    TaskRead,
+    TaskDetailRead,
+    TaskCreated,
+    TaskPage,
+    TaskSearchPage,
+    DueTasks,
+)
 from database import db_helper
-from auth import api_key_header
-from api.schemas import TaskPOST, SubTaskPOST, TaskPatch, SubTaskPostToMain
-from models import Task, SubTask, User
+from models import SEARCH_CONFIG, Task, SubTask
 import uuid
-from api.utils import get_task, get_subtask, get_user
+from task_cache import CachedTask, task_cache
+from idempotency import idempotency
+from ai.service import suggestion_service
+from ai.jobs import TERMINAL_STATUSES, job_event_streams, subtask_jobs
+from redis_client import get_redis
+from api.utils import (
+    LoadProfile,
+    get_task,
+    encode_cursor,
+    decode_cursor,
+    encode_search_cursor,
+    decode_search_cursor,
+    model_response,
+    raise_ownership_error,
+    adjust_subtask_counters,
+)
 
 
 router = APIRouter(prefix="/v1/task")
 
 
-@router.post("", tags=["task", "private"])
+@router.get("", tags=["task", "private"], response_model=TaskPage)
+async def list_tasks(
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    owner_id: uuid.UUID | None = None,
+    is_completed: bool | None = None,
+    is_public: bool | None = None,
+    deadline_from: datetime | None = None,
+    deadline_to: datetime | None = None,
+    user_id: str = Depends(api_key_header),
+    session: AsyncSession = Depends(read_session),
+):
+    """
+    Список задач пользователя от новых к старым с keyset-пагинацией по (created_at, id).
+    Чужие задачи отдаются только публичные.
+    """
+    if owner_id is None:
+        owner_id = uuid.UUID(user_id)
+    query = select(Task).where(Task.owner_id == owner_id)
+    if str(owner_id) != user_id:
+        is_public = True
+    if is_public is not None:
+        query = query.where(Task.is_public == is_public)
+    if is_completed is not None:
+        query = query.where(Task.is_completed == is_completed)
+    if deadline_from is not None:
+        query = query.where(Task.deadline >= deadline_from)
+    if deadline_to is not None:
+        query = query.where(Task.deadline <= deadline_to)
+    if cursor is not None:
+        query = query.where(tuple_(Task.created_at, Task.id) < decode_cursor(cursor))
+    query = query.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1)
+    tasks = list(await session.scalars(query))
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1].created_at, tasks[-1].id)
+    return model_response(TaskPage, {"items": tasks, "next_cursor": next_cursor})
+
+
+@router.get("/search", tags=["task", "private"], response_model=TaskSearchPage)
+async def search_tasks(
+    q: str = Query(min_length=2, max_length=200),
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    user_id: str = Depends(api_key_header),
+    session: AsyncSession = Depends(read_session),
+):
+    """
+    Полнотекстовый поиск по названию и описанию задач и названиям подзадач
+    среди своих и публичных задач. Совпадения ищутся по GIN индексам tsvector,
+    задача получает лучший ранг из своих совпадений (совпадение в подзадаче
+    весит вдвое меньше), пагинация keyset по (ранг, id).
+    """
+    query_vector = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    visible = or_(Task.owner_id == uuid.UUID(user_id), Task.is_public)
+    matches = union_all(
+        select(Task.id.label("task_id"), func.ts_rank(Task.search_vector, query_vector).label("rank"))
+        .where(Task.search_vector.bool_op("@@")(query_vector), visible),
+        select(SubTask.parent_id, func.ts_rank(SubTask.search_vector, query_vector) * 0.5)
+        .join(Task, SubTask.parent_id == Task.id)
+        .where(SubTask.search_vector.bool_op("@@")(query_vector), visible),
+    ).subquery()
+    ranked = (
+        select(matches.c.task_id, func.max(matches.c.rank).label("rank"))
+        .group_by(matches.c.task_id)
+        .subquery()
+    )
+    query = (
+        select(Task)
+        .join(ranked, ranked.c.task_id == Task.id)
+        .options(with_expression(Task.search_rank, ranked.c.rank))
+    )
+    if cursor is not None:
+        query = query.where(tuple_(ranked.c.rank, Task.id) < decode_search_cursor(cursor))
+    query = query.order_by(ranked.c.rank.desc(), Task.id.desc()).limit(limit + 1)
+    tasks = list(await session.scalars(query))
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_search_cursor(tasks[-1].search_rank, tasks[-1].id)
+    return model_response(TaskSearchPage, {"items": tasks, "next_cursor": next_cursor})
+
+
+@router.get("/due", tags=["task", "private"], response_model=DueTasks)
+async def due_tasks(
+    within_hours: int = Query(default=24, ge=1, le=24 * 30),
+    limit: int = Query(default=50, ge=1, le=200),
+    user_id: str = Depends(api_key_header),
+    session: AsyncSession = Depends(read_session),
+):
+    """
+    Незавершённые задачи пользователя: просроченные (самые свежие первыми)
+    и с дедлайном в ближайшие within_hours часов. Оба списка - диапазонные
+    чтения частичного индекса (owner_id, deadline).
+    """
+    now = datetime.now(timezone.utc)
+    open_tasks = select(Task).where(
+        Task.owner_id == uuid.UUID(user_id),
+        ~Task.is_completed,
+        Task.deadline.is_not(None),
+    )
+    overdue = await session.scalars(
+        open_tasks.where(Task.deadline < now).order_by(Task.deadline.desc()).limit(limit)
+    )
+    upcoming = await session.scalars(
+        open_tasks.where(Task.deadline >= now, Task.deadline < now + timedelta(hours=within_hours))
+        .order_by(Task.deadline)
+        .limit(limit)
+    )
+    return model_response(DueTasks, {"overdue": list(overdue), "upcoming": list(upcoming)})
+
+
+@router.post("", tags=["task", "private"], response_model=TaskCreated)
 async def create_task(
     task_data: TaskPOST,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
+    idempotency_key: str | None = Header(None, max_length=255),
 ):
-    try:
-        subtasks_to_create = []
-        subtasks = task_data.__dict__.pop("subtasks")
-        main_task = Task(id=uuid.uuid4(), **task_data.model_dump())
-        session.add(main_task)
-        if len(subtasks) > 0:
-            for task in subtasks:
-                subtasks_to_create.append(
-                    SubTask(parent_id=main_task.id, name=task.name)
-                )
-        session.add_all(subtasks_to_create)
-        await session.commit()
-        return {**main_task.__dict__, "subtasks": subtasks_to_create}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    """Повтор с тем же заголовком Idempotency-Key вернёт первый ответ, не создавая задачу снова"""
+    async def create() -> Response:
+        subtasks = task_data.subtasks
+        try:
+            main_task = Task(
+                id=uuid.uuid4(),
+                subtasks=[
+                    SubTask(name=subtask.name, is_completed=subtask.is_completed)
+                    for subtask in subtasks
+                ],
+                subtask_count=len(subtasks),
+                completed_subtask_count=sum(subtask.is_completed for subtask in subtasks),
+                **task_data.model_dump(exclude={"subtasks", "generate_subtasks"}),
+            )
+            session.add(main_task)
+            await session.commit()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response = TaskCreated.model_validate(main_task)
+        if task_data.generate_subtasks and not subtasks:
+            # подзадачи сгенерирует фоновый воркер, статус - в /subtask-jobs/{task_id}
+            try:
+                await subtask_jobs.enqueue(str(main_task.id), main_task.name, user_id)
+                response.subtask_job = {"status": "pending"}
+            except RedisError:
+                # задача уже сохранена: ошибка здесь заставила бы клиента повторить
+                # запрос и создать дубликат, поэтому в ответе только статус генерации
+                response.subtask_job = {"status": "failed", "error": "Subtask generation is unavailable"}
+        return Response(content=response.model_dump_json(), media_type="application/json")
+
+    return await idempotency.run(
+        user_id, "create_task", idempotency_key, task_data.model_dump_json(), create
+    )
 
 
 @router.delete("/delete/{task_id}", tags=["task", "private"])
 async def delete_task(
-    task_id: str,
+    task_id: uuid.UUID,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
 ):
-    task = await get_task(session, id=task_id)
-    if str(task.owner_id) != user_id:
-        raise HTTPException(
-            status_code=403, detail="Task can be deleted only by its owner"
+    # подзадачи удаляет ON DELETE CASCADE в бд
+    deleted_id = await session.scalar(
+        delete(Task)
+        .where(Task.id == task_id, Task.owner_id == uuid.UUID(user_id))
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    if deleted_id is None:
+        await raise_ownership_error(
+            session,
+            select(Task.owner_id).where(Task.id == task_id),
+            not_found="Task with this attributes was not found",
+            forbidden="Task can be deleted only by its owner",
         )
-    await session.delete(task)
     await session.commit()
+    await task_cache.invalidate(deleted_id)
     return {"success": True}
 
 
 @router.delete("/delete/subtask/{subtask_id}", tags=["task", "private"])
 async def delete_subtask(
-    subtask_id: str,
+    subtask_id: uuid.UUID,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
 ):
-    subtask = await get_subtask(session, id=subtask_id)
-    if subtask.parent.owner_id != user_id:
-        raise HTTPException(
-            status_code=403, detail="SubTask can be deleted only by its owner"
+    deleted = (
+        delete(SubTask)
+        .where(
+            SubTask.id == subtask_id,
+            SubTask.parent.has(Task.owner_id == uuid.UUID(user_id)),
+        )
+        .returning(SubTask.parent_id, SubTask.is_completed)
+        .cte("deleted_subtask")
+    )
+    # удаление и уменьшение счётчиков родителя - один запрос
+    parent_id = await session.scalar(
+        update(Task)
+        .where(Task.id == deleted.c.parent_id)
+        .values(
+            subtask_count=Task.subtask_count - 1,
+            completed_subtask_count=Task.completed_subtask_count
+            - case((deleted.c.is_completed, 1), else_=0),
+        )
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    if parent_id is None:
+        await raise_ownership_error(
+            session,
+            select(Task.owner_id)
+            .join(SubTask, SubTask.parent_id == Task.id)
+            .where(SubTask.id == subtask_id),
+            not_found="SubTask with this attributes was not found",
+            forbidden="SubTask can be deleted only by its owner",
         )
-    await session.delete(subtask)
     await session.commit()
+    await task_cache.invalidate(parent_id)
     return {"success": True}
 
 
-@router.get("/retrieve/{task_id}")
+@router.get("/retrieve/{task_id}", response_model=TaskDetailRead)
 async def retrieve_task(
-    task_id: str,
+    task_id: uuid.UUID,
     user_id: str | None = Depends(api_key_header),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
-    task = await get_task(session, id=task_id)
-    if task.is_public is not True and str(task.owner_id) != user_id:
+    """
+    Задача из общего кеша. Промах загружается из основной бд, а не с реплики:
+    отставшая реплика записала бы в кеш старую версию сразу после инвалидации,
+    и она отдавалась бы всем до истечения ttl. Соединение берётся только при промахе.
+    """
+    async def load_task() -> CachedTask:
+        task = await get_task(session, load=LoadProfile.FULL, id=task_id)
+        return CachedTask(
+            owner_id=str(task.owner_id),
+            is_public=task.is_public,
+            body=TaskDetailRead.model_validate(task).model_dump_json(),
+        )
+
+    # ключ кеша - каноничная запись uuid, та же, что удаляет invalidate
+    task = await task_cache.get_or_load(str(task_id), load_task)
+    if task.is_public is not True and task.owner_id != user_id:
         raise HTTPException(status_code=403, detail="This task is private")
-    return task
+    return Response(content=task.body, media_type="application/json")
 
 
-@router.patch("/update", tags=["task", "private"])
+@router.patch("/update", tags=["task", "private"], response_model=TaskRead)
 async def update_task(
     task_data: TaskPatch,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
 ):
-    task = await get_task(session, id=str(task_data.id))
-    if str(task.owner_id) != user_id:
-        raise HTTPException(
-            status_code=403, detail="Task can be changed only by its owner"
+    new_data_dict = task_data.model_dump(exclude={"id"}, exclude_none=True)
+    owned = [Task.id == task_data.id, Task.owner_id == uuid.UUID(user_id)]
+    if new_data_dict:
+        query = update(Task).where(*owned).values(**new_data_dict).returning(Task)
+    else:
+        query = select(Task).where(*owned)
+    task = await session.scalar(query)
+    if task is None:
+        await raise_ownership_error(
+            session,
+            select(Task.owner_id).where(Task.id == task_data.id),
+            not_found="Task with this attributes was not found",
+            forbidden="Task can be changed only by its owner",
         )
-    new_data_dict = task_data.model_dump(exclude_none=True)
-    for key, value in new_data_dict.items():
-        setattr(task, key, value)
     await session.commit()
-    return task
+    if new_data_dict:
+        await task_cache.invalidate(task.id)
+    return model_response(TaskRead, task)
 
 
-@router.post("/add-subtask", tags=["task", "private"])
+@router.post("/add-subtask", tags=["task", "private"], response_model=TaskRead)
 async def create_subtasks(
     data: SubTaskPostToMain,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
+    idempotency_key: str | None = Header(None, max_length=255),
 ):
-    task = await get_task(session, id=str(data.main_task_id))
-    if str(task.owner_id) != user_id:
-        raise HTTPException(
-            status_code=403, detail="Task can be changed only by its owner"
+    """
+    Добавление подзадач одним запросом: INSERT ... SELECT вставляет строки только
+    если задача принадлежит пользователю, а UPDATE той же задачи увеличивает
+    её счётчики подзадач и возвращает её.
+    Повтор с тем же заголовком Idempotency-Key вернёт первый ответ без вставки.
+    """
+    async def add() -> Response:
+        owned = [Task.id == data.main_task_id, Task.owner_id == uuid.UUID(user_id)]
+        if not data.subtasks:
+            query = select(Task).where(*owned)
+        else:
+            new_subtasks = values(
+                column("id", Uuid),
+                column("name", String),
+                column("is_completed", Boolean),
+                name="new_subtasks",
+            ).data(
+                [(uuid.uuid4(), subtask.name, subtask.is_completed) for subtask in data.subtasks]
+            )
+            inserted = (
+                insert(SubTask)
+                .from_select(
+                    ["id", "name", "is_completed", "parent_id"],
+                    select(
+                        new_subtasks.c.id,
+                        new_subtasks.c.name,
+                        new_subtasks.c.is_completed,
+                        Task.id,
+                    ).where(*owned),
+                )
+                .cte("inserted_subtasks")
+            )
+            completed = sum(subtask.is_completed for subtask in data.subtasks)
+            # CTE с INSERT выполняется в postgres, даже если основной запрос его не читает
+            query = (
+                update(Task)
+                .where(*owned)
+                .values(
+                    subtask_count=Task.subtask_count + len(data.subtasks),
+                    completed_subtask_count=Task.completed_subtask_count + completed,
+                )
+                .returning(Task)
+                .add_cte(inserted)
+            )
+        task = await session.scalar(query)
+        if task is None:
+            await raise_ownership_error(
+                session,
+                select(Task.owner_id).where(Task.id == data.main_task_id),
+                not_found="Task with this attributes was not found",
+                forbidden="Task can be changed only by its owner",
+            )
+        await session.commit()
+        await task_cache.invalidate(task.id)
+        return model_response(TaskRead, task)
+
+    return await idempotency.run(
+        user_id, "add_subtasks", idempotency_key, data.model_dump_json(), add
+    )
+
+
+@router.post("/bulk", tags=["task", "private"])
+async def bulk_task_operations(
+    data: BulkTaskOperations,
+    user_id: str = Depends(api_key_header),
+    session: AsyncSession = Depends(write_session),
+):
+    """
+    Пакетное создание, изменение и удаление задач и переключение подзадач в одной транзакции.
+    Права проверяются одним запросом, изменения выполняются множественными INSERT/UPDATE/DELETE.
+    Возвращает результат по каждой операции в порядке запроса.
+    """
+    owner_id = uuid.UUID(user_id)
+    operations = list(enumerate(data.operations))
+    results: list[dict] = [{} for _ in operations]
+
+    task_ids = {op.id for _, op in operations if op.op in ("patch", "delete")}
+    subtask_ids = {op.id for _, op in operations if op.op == "toggle_subtask"}
+    # айди записи -> (владелец, айди задачи) для задач и подзадач одним запросом
+    owners: dict[uuid.UUID, tuple[uuid.UUID, uuid.UUID]] = {}
+    if task_ids or subtask_ids:
+        query = union_all(
+            select(Task.id, Task.owner_id, Task.id).where(Task.id.in_(task_ids)),
+            select(SubTask.id, Task.owner_id, Task.id)
+            .join(Task, SubTask.parent_id == Task.id)
+            .where(SubTask.id.in_(subtask_ids)),
         )
-    tasks_to_create = []
-    for subtask in data.subtasks:
-        tasks_to_create.append(
-            SubTask(name=subtask.name, is_completed=subtask.is_completed, parent_id=task.id)
+        for id, owner, task_id in await session.execute(query):
+            owners[id] = (owner, task_id)
+
+    def check_owner(index: int, op) -> bool:
+        if op.id not in owners:
+            results[index] = {"op": op.op, "id": op.id, "status": 404}
+            return False
+        if owners[op.id][0] != owner_id:
+            results[index] = {"op": op.op, "id": op.id, "status": 403}
+            return False
+        results[index] = {"op": op.op, "id": op.id, "status": 200}
+        return True
+
+    task_rows, subtask_rows = [], []
+    for index, op in operations:
+        if op.op != "create":
+            continue
+        task_id = uuid.uuid4()
+        task_data = op.model_dump(
+            exclude={"op", "subtasks", "owner_id", "generate_subtasks"}
+        )
+        task_rows.append(
+            {
+                **task_data,
+                "id": task_id,
+                "owner_id": owner_id,
+                "subtask_count": len(op.subtasks),
+                "completed_subtask_count": sum(subtask.is_completed for subtask in op.subtasks),
+            }
+        )
+        for subtask in op.subtasks:
+            subtask_rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "parent_id": task_id,
+                    "name": subtask.name,
+                    "is_completed": subtask.is_completed,
+                }
+            )
+        owners[task_id] = (owner_id, task_id)
+        results[index] = {"op": op.op, "id": task_id, "status": 201}
+    if task_rows:
+        await session.execute(insert(Task), task_rows)
+    if subtask_rows:
+        await session.execute(insert(SubTask), subtask_rows)
+
+    patches: dict[uuid.UUID, dict] = {}
+    toggles: dict[uuid.UUID, bool] = {}
+    deletes: list[uuid.UUID] = []
+    changed_tasks: set[uuid.UUID] = set()
+    for index, op in operations:
+        if op.op == "create" or not check_owner(index, op):
+            continue
+        changed_tasks.add(owners[op.id][1])
+        if op.op == "patch":
+            patch = op.model_dump(exclude={"op", "id"}, exclude_none=True)
+            if patch:
+                patches.setdefault(op.id, {}).update(patch)
+        elif op.op == "toggle_subtask":
+            # в силе последнее переключение подзадачи, как при последовательном выполнении
+            toggles[op.id] = op.is_completed
+        elif op.op == "delete":
+            deletes.append(op.id)
+
+    if patches:
+        # один UPDATE на все патчи: каждое поле - CASE по первичному ключу,
+        # у задач, где поле не меняется, остаётся прежнее значение
+        fields = {name for patch in patches.values() for name in patch}
+        changes = {}
+        for name in fields:
+            field = getattr(Task, name)
+            changes[name] = case(
+                {
+                    task_id: literal(patch[name], field.type)
+                    for task_id, patch in patches.items()
+                    if name in patch
+                },
+                value=Task.id,
+                else_=field,
+            )
+        # владелец проверяется повторно: задачу могли передать другому после проверки прав
+        await session.execute(
+            update(Task)
+            .where(Task.id.in_(patches), Task.owner_id == owner_id)
+            .values(changes)
+            .execution_options(synchronize_session=False)
+        )
+    # счётчики меняются только у подзадач, чей статус действительно изменился
+    counter_deltas: dict[uuid.UUID, tuple[int, int]] = {}
+    toggle_groups: dict[bool, list[uuid.UUID]] = {}
+    for subtask_id, is_completed in toggles.items():
+        toggle_groups.setdefault(is_completed, []).append(subtask_id)
+    owned_tasks = select(Task.id).where(
+        Task.id.in_({owners[subtask_id][1] for subtask_id in toggles}),
+        Task.owner_id == owner_id,
+    )
+    for is_completed, ids in toggle_groups.items():
+        toggled = await session.scalars(
+            update(SubTask)
+            .where(
+                SubTask.id.in_(ids),
+                SubTask.parent_id.in_(owned_tasks),
+                SubTask.is_completed.is_not(is_completed),
+            )
+            .values(is_completed=is_completed)
+            .returning(SubTask.parent_id)
+            .execution_options(synchronize_session=False)
+        )
+        for parent_id in toggled:
+            completed = counter_deltas.get(parent_id, (0, 0))[1]
+            counter_deltas[parent_id] = (0, completed + (1 if is_completed else -1))
+    await adjust_subtask_counters(session, counter_deltas)
+    if deletes:
+        await session.execute(
+            delete(Task)
+            .where(Task.id.in_(deletes), Task.owner_id == owner_id)
+            .execution_options(synchronize_session=False)
         )
-    session.add_all(tasks_to_create)
     await session.commit()
-    return task
+    await task_cache.invalidate(*changed_tasks)
+    return {"results": results}
+
+
+@router.post("/suggest-subtasks", tags=["task", "private", "ai"])
+async def suggest_subtasks(
+    data: SubtaskSuggestionRequest,
+    user_id: str = Depends(api_key_header),
+):
+    subtasks = await suggestion_service.suggest(data.name)
+    return {"subtasks": subtasks}
+
+
+@router.post("/suggest-subtasks/stream", tags=["task", "private", "ai"])
+async def stream_suggested_subtasks(
+    data: SubtaskSuggestionRequest,
+    user_id: str = Depends(api_key_header),
+):
+    """
+    Подсказки подзадач в виде Server-Sent Events: каждая подзадача отправляется
+    отдельным событием сразу после генерации, в конце приходит событие done.
+    При отключении клиента генерация прерывается.
+    """
+    if not suggestion_service.is_ready:
+        raise HTTPException(status_code=503, detail="Subtask suggestions are unavailable")
+
+    async def events():
+        try:
+            async for subtask in suggestion_service.stream(data.name):
+                yield f"data: {json.dumps({'subtask': subtask}, ensure_ascii=False)}\n\n"
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def get_own_subtask_job(task_id: str, user_id: str) -> dict:
+    job = await subtask_jobs.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Subtask job was not found")
+    if job["owner_id"] != user_id:
+        raise HTTPException(status_code=403, detail="This task is private")
+    return job
+
+
+@router.get("/subtask-jobs/{task_id}", tags=["task", "private", "ai"])
+async def get_subtask_job(
+    task_id: str,
+    user_id: str = Depends(api_key_header),
+):
+    return await get_own_subtask_job(task_id, user_id)
+
+
+@router.get("/subtask-jobs/{task_id}/events", tags=["task", "private", "ai"])
+async def subscribe_subtask_job(
+    task_id: str,
+    user_id: str = Depends(api_key_header),
+):
+    """
+    Статус задания генерации подзадач в виде Server-Sent Events до его завершения.
+    Поток живёт не дольше events_max_duration секунд (EventSource переподключится),
+    в тишине отправляются комментарии-heartbeat, число потоков ограничено.
+    """
+    await get_own_subtask_job(task_id, user_id)
+    config = settings.jobs
+    if not job_event_streams.has_room(user_id):
+        raise HTTPException(status_code=429, detail="Too many open subtask job streams")
+
+    async def events():
+        # место занимается при старте потока: слот, занятый до ответа,
+        # не освободился бы, если клиент отключится раньше первого чтения
+        if not job_event_streams.acquire(user_id):
+            yield 'event: error\ndata: "Too many open subtask job streams"\n\n'
+            return
+        pubsub = None
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            # подписка раньше чтения статуса, чтобы не пропустить завершение между ними
+            await pubsub.subscribe(subtask_jobs.channel(task_id))
+            job = await subtask_jobs.get(task_id)
+            yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n"
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return
+            deadline = time.monotonic() + config.events_max_duration
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=config.events_heartbeat
+                )
+                if message is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"data: {message['data']}\n\n"
+                if json.loads(message["data"])["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_event_streams.release(user_id)
+            if pubsub is not None:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,3 +1,4 @@
+import uuid
 from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import SecretStr
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -6,7 +7,9 @@ from api.schemas import (
     ProfileUpdate,
     RegisterUserData,
     LoginData,
-    ConfidentialData
+    ConfidentialData,
+    UserRead,
+    UserPublicRead,
     )
 from auth import (
     create_tokens,
@@ -15,16 +18,21 @@ from auth import (
     verify_password,
     service_refresh_tokens,
     logout_refresh_token,
+    revoke_user_tokens,
+    write_session,
 )
-from api.utils import get_user
+from api.utils import LoadProfile, get_user, model_response
 from database import db_helper
 from models import User
+from rate_limit import rate_limit
 
 
 router = APIRouter(prefix="/v1/user")
 
 
-@router.post("/register", tags=["public", "profile"])
+@router.post(
+    "/register", tags=["public", "profile"], dependencies=[Depends(rate_limit("register"))]
+)
 async def register_user(
     data: RegisterUserData, session: AsyncSession = Depends(db_helper.session_getter)
 ):
@@ -33,7 +41,7 @@ async def register_user(
             email=data.email,
             name=data.name,
             last_name=data.last_name,
-            hashed_password=hash_password(data.password),
+            hashed_password=await hash_password(data.password),
         )
         session.add(user)
         await session.commit()
@@ -50,13 +58,17 @@ async def secured_method(user_id: str = Depends(api_key_header)):
     return {"user_id": user_id}
 
 
-@router.post("/tokens/refresh", tags=["secret"])
+@router.post("/tokens/refresh", tags=["secret"], dependencies=[Depends(rate_limit("refresh"))])
 async def refresh_tokens(refresh: str = Header(...)):
     new_tokens = await service_refresh_tokens(refresh)
     return {"access": new_tokens[0], "refresh": new_tokens[1]}
 
 
-@router.post("/login", tags=["public", "profile"])
+@router.post(
+    "/login",
+    tags=["public", "profile"],
+    dependencies=[Depends(rate_limit("login", account="email"))],
+)
 async def login_method(
     data: LoginData, session: AsyncSession = Depends(db_helper.session_getter)
 ):
@@ -77,50 +89,65 @@ async def logout_method(
     return resp
 
 
-@router.patch("/update", tags=["private", "profile"])
+@router.post("/logout/all", tags=["private", "profile"])
+async def logout_all_method(user_id: str = Depends(api_key_header)):
+    revoked = await revoke_user_tokens(user_id)
+    return {"success": True, "revoked": revoked}
+
+
+@router.patch("/update", tags=["private", "profile"], response_model=UserRead)
 async def update_profile(
     new_data: ProfileUpdate,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
 ):
-    user = await get_user(session, id=user_id)
+    user = await get_user(session, id=uuid.UUID(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     new_data_dict = new_data.model_dump(exclude_none=True)
     for key, value in new_data_dict.items():
         setattr(user, key, value)
     await session.commit()
-    return user
+    return model_response(UserRead, user)
 
 
-@router.post("/update/confidential", tags=["private", "confidential"])
+@router.post(
+    "/update/confidential", tags=["private", "confidential"], response_model=UserRead
+)
 async def change_confidentials(
     confidential_data: ConfidentialData,
     user_id: str = Depends(api_key_header),
-    session: AsyncSession = Depends(db_helper.session_getter),
+    session: AsyncSession = Depends(write_session),
 ):
-    user = await get_user(session, id=user_id)
+    user = await get_user(session, id=uuid.UUID(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     confidential_data = confidential_data.model_dump(exclude_none=True)
     for key, value in confidential_data.items():
         if key == "new_password":
             key = "hashed_password"
-            value = hash_password(value)
+            value = await hash_password(value)
         if key == "new_email":
             key = "email"
         setattr(user, key, value)
     await session.commit()
-    return user
+    if confidential_data:
+        # после смены пароля или почты все выданные сессии становятся недействительными
+        await revoke_user_tokens(user_id)
+    return model_response(UserRead, user)
 
 
-@router.post("/verify-password", tags=["private", "confidential"])
+@router.post(
+    "/verify-password",
+    tags=["private", "confidential"],
+    dependencies=[Depends(rate_limit("verify_password", account="user"))],
+)
 async def check_passwords(
     input_password: SecretStr,
     user_id: str = Depends(api_key_header),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
-    user = await get_user(session, id=user_id)
+    user = await get_user(session, id=uuid.UUID(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     isValid = await verify_password(user.email, input_password, session, user)
@@ -129,10 +156,10 @@ async def check_passwords(
     return {"success": True}
 
 
-@router.get("/{user_id}", tags=["public", "profile"])
+@router.get("/{user_id}", tags=["public", "profile"], response_model=UserPublicRead)
 async def get_user_profile(
-    user_id: str,
-    session: AsyncSession = Depends(db_helper.session_getter),
+    user_id: uuid.UUID,
+    session: AsyncSession = Depends(db_helper.read_session_getter),
 ):
-    user = await get_user(session, id=user_id)
-    return user
+    user = await get_user(session, load=LoadProfile.SUMMARY, id=user_id)
+    return model_response(UserPublicRead, user)
@@ -1,32 +1,162 @@
+import base64
+import binascii
+import enum
+import uuid
+from datetime import datetime
+from typing import NoReturn
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import User, Task, SubTask
-from fastapi import HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload, joinedload
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import select, func, update
+from sqlalchemy.orm import selectinload, joinedload, with_expression
 
 
-async def get_task(session: AsyncSession, **attributes) -> Task:
+class LoadProfile(enum.Enum):
+    """
+    Профиль загрузки связанных данных:
+    NONE - только сама запись, SUMMARY - запись и счётчики связанных записей,
+    FULL - запись со всеми связанными записями.
+    """
+    NONE = "none"
+    SUMMARY = "summary"
+    FULL = "full"
+
+
+def _task_options(load: LoadProfile) -> list:
+    # для SUMMARY ничего не нужно: счётчики подзадач хранятся в самой задаче
+    if load is LoadProfile.FULL:
+        return [selectinload(Task.subtasks)]
+    return []
+
+
+def _subtask_options(load: LoadProfile) -> list:
+    if load is LoadProfile.SUMMARY:
+        # для проверки прав хватает владельца и публичности родительской задачи
+        return [joinedload(SubTask.parent).load_only(Task.owner_id, Task.is_public)]
+    if load is LoadProfile.FULL:
+        return [joinedload(SubTask.parent)]
+    return []
+
+
+def _user_options(load: LoadProfile) -> list:
+    if load is LoadProfile.SUMMARY:
+        return [
+            with_expression(
+                User.task_count,
+                select(func.count(Task.id)).where(Task.owner_id == User.id).scalar_subquery(),
+            )
+        ]
+    if load is LoadProfile.FULL:
+        return [selectinload(User.tasks).selectinload(Task.subtasks)]
+    return []
+
+
+async def get_task(
+    session: AsyncSession, load: LoadProfile = LoadProfile.NONE, **attributes
+) -> Task:
     """Метод для получения модели таска из бд по его аттрибутам"""
-    query = select(Task).filter_by(**attributes).options(selectinload(Task.subtasks))
+    query = select(Task).filter_by(**attributes).options(*_task_options(load))
     task = await session.scalar(query)
     if not task:
         raise HTTPException(status_code=404, detail="Task with this attributes was not found")
     return task
 
 
-async def get_subtask(session: AsyncSession, **attributes) -> SubTask:
+async def get_subtask(
+    session: AsyncSession, load: LoadProfile = LoadProfile.NONE, **attributes
+) -> SubTask:
     """Метод для получения модели сабтаска из бд по его аттрибутам"""
-    query = select(SubTask).filter_by(**attributes).options(joinedload(SubTask.parent)) # joinedload так как 
+    query = select(SubTask).filter_by(**attributes).options(*_subtask_options(load))
     subtask = await session.scalar(query)
     if not subtask:
         raise HTTPException(status_code=404, detail="SubTask with this attributes was not found")
     return subtask
 
 
-async def get_user(session: AsyncSession, **attributes) -> User:
+async def raise_ownership_error(
+    session: AsyncSession, owner_query, not_found: str, forbidden: str
+) -> NoReturn:
+    """
+    Разбор пустого результата UPDATE/DELETE с условием на владельца: дополнительный
+    запрос владельца выполняется только в этом случае и отличает 404 от 403.
+    """
+    if await session.scalar(owner_query) is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    raise HTTPException(status_code=403, detail=forbidden)
+
+
+async def get_user(
+    session: AsyncSession, load: LoadProfile = LoadProfile.NONE, **attributes
+) -> User:
     """Метод для получения юзера из базы данных по его аттрибутам"""
-    query = select(User).filter_by(**attributes).options(selectinload(User.tasks))
+    query = select(User).filter_by(**attributes).options(*_user_options(load))
     user = await session.scalar(query)
     if not user:
         raise HTTPException(status_code=404, detail="User with this attributes was not found")
     return user
+
+
+async def adjust_subtask_counters(
+    session: AsyncSession, deltas: dict[uuid.UUID, tuple[int, int]]
+) -> None:
+    """
+    Изменение счётчиков подзадач задач на (всего, выполнено) в текущей транзакции.
+    Задачи с одинаковым изменением обновляются одним UPDATE ... WHERE id IN (...).
+    """
+    groups: dict[tuple[int, int], list[uuid.UUID]] = {}
+    for task_id, delta in deltas.items():
+        if delta != (0, 0):
+            groups.setdefault(delta, []).append(task_id)
+    for (total, completed), ids in groups.items():
+        await session.execute(
+            update(Task)
+            .where(Task.id.in_(ids))
+            .values(
+                subtask_count=Task.subtask_count + total,
+                completed_subtask_count=Task.completed_subtask_count + completed,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def encode_cursor(created_at: datetime, id: uuid.UUID) -> str:
+    """Курсор для keyset-пагинации: позиция последней отданной записи"""
+    raw = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Разбор курсора, полученного от encode_cursor"""
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_search_cursor(rank: float, id: uuid.UUID) -> str:
+    """Курсор для пагинации результатов поиска по (ранг, id)"""
+    raw = f"{rank!r}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    """Разбор курсора, полученного от encode_search_cursor"""
+    try:
+        rank, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(rank), uuid.UUID(id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def model_response(schema: type[BaseModel], data, status_code: int = 200) -> Response:
+    """
+    Ответ из ORM объекта через схему: pydantic-core сразу сериализует его в JSON,
+    без обхода объекта через jsonable_encoder.
+    """
+    return Response(
+        content=schema.model_validate(data).model_dump_json(),
+        media_type="application/json",
+        status_code=status_code,
+    )
@@ -2,15 +2,19 @@ from pydantic import SecretStr
 from sqlalchemy import select
 import jwt
 from config import settings
-from passlib.context import CryptContext
 import datetime
+import time
 from datetime import timedelta
 import uuid
 from models import User
-from fastapi import HTTPException, Header
+from fastapi import Depends, HTTPException, Header
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
+from database import db_helper
 from redis_client import get_redis
 from api.utils import get_user
+from password_hasher import password_hasher
+from token_cache import token_cache
 
 
 SECRET_KEY = settings.hash.secret
@@ -18,14 +22,44 @@ ALGORITHM = settings.hash.algorithm
 ACCESS_TOKEN_LIFETIME = settings.hash.access_token_lifetime
 REFRESH_TOKEN_LIFETIME = settings.hash.refresh_token_lifetime
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+REFRESH_TOKEN_TTL = REFRESH_TOKEN_LIFETIME * 60 * 60 * 24
 
-async def create_tokens(data: dict) -> tuple[str, str]:
+# KEYS[1] - айди старого рефреш токена, KEYS[2] - айди нового, KEYS[3] - сессии юзера
+# ARGV[1] - айди юзера, ARGV[2] - время жизни нового токена в секундах, ARGV[3] - текущее время
+ROTATE_REFRESH_TOKEN = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+redis.call('ZREM', KEYS[3], KEYS[1])
+redis.call('ZADD', KEYS[3], ARGV[3] + ARGV[2], KEYS[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+
+# KEYS[1] - сессии юзера. Удаляет все его рефреш токены и сам индекс
+REVOKE_USER_TOKENS = """
+local tokens = redis.call('ZRANGE', KEYS[1], 0, -1)
+for i = 1, #tokens, 500 do
+    redis.call('DEL', unpack(tokens, i, math.min(i + 499, #tokens)))
+end
+redis.call('DEL', KEYS[1])
+return #tokens
+"""
+
+
+def sessions_key(user_id: str) -> str:
+    """Ключ индекса рефреш токенов юзера: айди токена -> время истечения"""
+    return f"sessions:{user_id}"
+
+
+def build_tokens(data: dict) -> tuple[str, str, str]:
     """
-    Метод для создания access и refresh токенов.
-    access и refresh - jwt токены, со сроками жизни 15 минут и 30 дней соответственно.
-    Сохраняет айди каждого рефреш токена как ключ и айди юзера как значение для "вайтлиста" токенов.
+    Метод для сборки access и refresh токенов без сохранения в редис.
+    Возвращает оба токена и айди рефреш токена.
     """
     to_encode = {"id": str(data["id"]), "email": data["email"]}
     acc_expire = datetime.datetime.now(datetime.timezone.utc) + timedelta(
@@ -41,15 +75,25 @@ async def create_tokens(data: dict) -> tuple[str, str]:
         "exp": refresh_expire,
         "token_id": str(uuid.uuid4()),
     }
-    await store_token_to_redis(refresh_payload["token_id"], to_encode["id"])
     access_token = jwt.encode(access_payload, SECRET_KEY, algorithm=ALGORITHM)
     refresh_token = jwt.encode(refresh_payload, SECRET_KEY, algorithm=ALGORITHM)
+    return (access_token, refresh_token, refresh_payload["token_id"])
+
+
+async def create_tokens(data: dict) -> tuple[str, str]:
+    """
+    Метод для создания access и refresh токенов.
+    access и refresh - jwt токены, со сроками жизни 15 минут и 30 дней соответственно.
+    Сохраняет айди каждого рефреш токена как ключ и айди юзера как значение для "вайтлиста" токенов.
+    """
+    access_token, refresh_token, token_id = build_tokens(data)
+    await store_token_to_redis(token_id, str(data["id"]))
     return (access_token, refresh_token)
 
 
-def hash_password(password: SecretStr) -> str:
-    """Хеширование пароля через CryptContext"""
-    return pwd_context.hash(password.get_secret_value())
+async def hash_password(password: SecretStr) -> str:
+    """Хеширование пароля через CryptContext в отдельном пуле, чтобы не блокировать event loop"""
+    return await password_hasher.hash(password.get_secret_value())
 
 
 async def verify_password(
@@ -58,40 +102,101 @@ async def verify_password(
     """Метод, получающий юзера из базы и сверяющий пароли."""
     if user is None:
         user = await get_user(session, email=email)
-    return pwd_context.verify(password.get_secret_value(), user.hashed_password)
+    return await password_hasher.verify(password.get_secret_value(), user.hashed_password)
 
 
-def api_key_header(authorization: str = Header(...)) -> str:
-    """Метод для обработки входящего токена авторизации в заголовках"""
+async def api_key_header(authorization: str = Header(...)) -> str:
+    """
+    Метод для обработки входящего токена авторизации в заголовках.
+    Проверенные access токены кешируются до их exp, повторная проверка подписи не нужна.
+    """
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
-            options={"require": ["exp"], "verify_exp": True},
-        )
-        user_id = payload.get("id")
-        type = payload.get("type")
-        if type is None or type != "access":
-            raise HTTPException(status_code=401, detail="Wrong auth token")
-        return user_id
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid authorization token")
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(
+                token,
+                SECRET_KEY,
+                algorithms=[ALGORITHM],
+                options={"require": ["exp"], "verify_exp": True},
+            )
+        except Exception:
+            raise HTTPException(status_code=401, detail="Invalid authorization token")
+        if payload.get("type") == "access":
+            token_cache.put(token, payload)
+    type = payload.get("type")
+    if type is None or type != "access":
+        raise HTTPException(status_code=401, detail="Wrong auth token")
+    return payload.get("id")
+
+
+def recent_writes_key(user_id: str) -> str:
+    return f"recent_writes:{user_id}"
+
+
+async def write_session(user_id: str = Depends(api_key_header)):
+    """
+    Сессия основной бд для изменяющих запросов. Пользователь помечается как
+    недавно писавший, и его чтения на время read_your_writes_seconds тоже идут
+    в основную бд, чтобы не увидеть отставшую реплику.
+    """
+    if db_helper.replicas:
+        try:
+            redis = await get_redis()
+            await redis.set(
+                recent_writes_key(user_id), 1, ex=settings.database.read_your_writes_seconds
+            )
+        except RedisError:
+            pass
+    async with db_helper.async_session_factory() as session:
+        yield session
+
+
+async def read_session(user_id: str = Depends(api_key_header)):
+    """Сессия для чтений пользователя: реплика, если он недавно ничего не менял"""
+    factory = db_helper.async_session_factory
+    if db_helper.replicas:
+        try:
+            redis = await get_redis()
+            if not await redis.exists(recent_writes_key(user_id)):
+                factory = db_helper.read_session_factory()
+        except RedisError:
+            pass
+    async with factory() as session:
+        yield session
 
 
 async def store_token_to_redis(token_id: str, user_id: str) -> None:
-    """Метод, сохраняющий айди токенов в редис, для создания 'вайтлиста' рефреш токенов"""
+    """
+    Метод, сохраняющий айди токенов в редис, для создания 'вайтлиста' рефреш токенов.
+    Вместе с токеном обновляется индекс сессий юзера, истёкшие записи из него вычищаются.
+    """
     redis = await get_redis()
-    await redis.set(token_id, user_id, ex=REFRESH_TOKEN_LIFETIME * 60 * 60 * 24)
+    now = int(time.time())
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(token_id, user_id, ex=REFRESH_TOKEN_TTL)
+        pipe.zadd(sessions_key(user_id), {token_id: now + REFRESH_TOKEN_TTL})
+        pipe.zremrangebyscore(sessions_key(user_id), "-inf", now)
+        pipe.expire(sessions_key(user_id), REFRESH_TOKEN_TTL)
+        await pipe.execute()
 
 
-async def delete_token_from_redis(token_id: str) -> None:
+async def delete_token_from_redis(token_id: str, user_id: str) -> None:
     """Метод, удаляющий айди неактуальные токены из редиса"""
     redis = await get_redis()
-    await redis.delete(token_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(token_id)
+        pipe.zrem(sessions_key(user_id), token_id)
+        await pipe.execute()
+
+
+async def revoke_user_tokens(user_id: str) -> int:
+    """Отзыв всех рефреш токенов юзера за один запрос к редису, возвращает их количество"""
+    redis = await get_redis()
+    revoke = redis.register_script(REVOKE_USER_TOKENS)
+    return await revoke(keys=[sessions_key(str(user_id))])
 
 
 async def logout_refresh_token(token: str):
@@ -100,21 +205,29 @@ async def logout_refresh_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         token_id = payload.get("token_id", None)
         token_type = payload.get("type", None)
-        if not token_id or not token_type or token_type != "refresh":
+        user_id = payload.get("id", None)
+        if not token_id or not user_id or not token_type or token_type != "refresh":
             raise HTTPException(status_code=401, detail="Wrong refresh token")
-        await delete_token_from_redis(token_id)
+        await delete_token_from_redis(token_id, user_id)
         return {"success": True}
+    except RedisError:
+        raise
     except Exception:
         raise HTTPException(status_code=401, detail="Cant decode refresh token")
 
 
-async def verify_refresh_token(token_id: uuid.UUID, user_id: uuid.UUID) -> bool:
-    """Метод, проверяющий на актуальность рефреш токен"""
+async def rotate_refresh_token(old_token_id: str, new_token_id: str, user_id: str) -> bool:
+    """
+    Атомарная замена старого рефреш токена новым за один запрос к редису.
+    Если старого токена нет во 'вайтлисте' (уже использован или отозван), возвращает False.
+    """
     redis = await get_redis()
-    stored_user_id = await redis.get(str(token_id))
-    if not stored_user_id or stored_user_id != user_id:
-        return False
-    return True
+    rotate = redis.register_script(ROTATE_REFRESH_TOKEN)
+    rotated = await rotate(
+        keys=[old_token_id, new_token_id, sessions_key(user_id)],
+        args=[user_id, REFRESH_TOKEN_TTL, int(time.time())],
+    )
+    return rotated == 1
 
 
 async def service_refresh_tokens(refresh_token: str):
@@ -129,12 +242,16 @@ async def service_refresh_tokens(refresh_token: str):
         type = payload.get("type")
         user_id = payload.get("id")
         token_id = payload.get("token_id")
-        is_valid = await verify_refresh_token(token_id, user_id)
-        if type is None or type != "refresh" or is_valid != True:
+        if type is None or type != "refresh" or not token_id or not user_id:
+            raise HTTPException(status_code=401, detail="Wrong or expired refresh token")
+        access_token, new_refresh_token, new_token_id = build_tokens(
+            {"id": user_id, "email": payload["email"]}
+        )
+        is_rotated = await rotate_refresh_token(str(token_id), new_token_id, user_id)
+        if is_rotated is not True:
             raise HTTPException(status_code=401, detail="Wrong or expired refresh token")
-        new_payload = {"id": user_id, "email": payload["email"]}
-        await delete_token_from_redis(str(token_id))
-        new_tokens = await create_tokens(new_payload)
-        return new_tokens
+        return (access_token, new_refresh_token)
+    except (HTTPException, RedisError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
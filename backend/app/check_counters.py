@@ -0,0 +1,68 @@
+"""
+Проверка денормализованных счётчиков подзадач в задачах.
+
+Запуск из папки app: python check_counters.py [--fix] [--chunk-size 5000]
+"""
+import argparse
+import asyncio
+import uuid
+from sqlalchemy import func, select, update
+from database import db_helper
+from models import Task, SubTask
+
+
+async def check_chunk(last_id: uuid.UUID, chunk_size: int, fix: bool) -> tuple[uuid.UUID | None, list]:
+    """Сверяет счётчики следующей пачки задач с подзадачами, возвращает последний id и расхождения"""
+    chunk = (
+        select(Task.id, Task.subtask_count, Task.completed_subtask_count)
+        .where(Task.id > last_id)
+        .order_by(Task.id)
+        .limit(chunk_size)
+        .subquery()
+    )
+    query = (
+        select(
+            chunk.c.id,
+            chunk.c.subtask_count,
+            chunk.c.completed_subtask_count,
+            func.count(SubTask.id),
+            func.count(SubTask.id).filter(SubTask.is_completed.is_(True)),
+        )
+        .outerjoin(SubTask, SubTask.parent_id == chunk.c.id)
+        .group_by(chunk.c.id, chunk.c.subtask_count, chunk.c.completed_subtask_count)
+        .order_by(chunk.c.id)
+    )
+    async with db_helper.async_session_factory() as session:
+        rows = (await session.execute(query)).all()
+        mismatches = [row for row in rows if (row[1], row[2]) != (row[3], row[4])]
+        if fix and mismatches:
+            await session.execute(
+                update(Task),
+                [
+                    {"id": id, "subtask_count": total, "completed_subtask_count": completed}
+                    for id, _, _, total, completed in mismatches
+                ],
+            )
+            await session.commit()
+    return (rows[-1][0] if rows else None), mismatches
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fix", action="store_true", help="исправить найденные расхождения")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    last_id, found = uuid.UUID(int=0), 0
+    try:
+        while last_id is not None:
+            last_id, mismatches = await check_chunk(last_id, args.chunk_size, args.fix)
+            for id, subtask_count, completed_count, total, completed in mismatches:
+                print(f"{id}: {subtask_count}/{completed_count} stored, {total}/{completed} actual")
+            found += len(mismatches)
+    finally:
+        await db_helper.dispose()
+    print(f"Mismatched tasks: {found}" + (" (fixed)" if args.fix and found else ""))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import BaseModel, PostgresDsn
 
@@ -6,6 +7,25 @@ class RunConfig(BaseModel):
     """Запускаемый конфиг приложения"""
     port: int = 8000
     host: str = '0.0.0.0'
+    # dev - один процесс с автоперезагрузкой, prod - мастер с воркерами (runner.py)
+    mode: Literal["dev", "prod"] = "dev"
+    workers: int = 0
+    backlog: int = 2048
+    preload_model: bool = True
+    max_requests: int = 10000
+    max_requests_jitter: int = 1000
+    max_memory_mb: int | None = None
+    memory_check_interval: float = 5
+    graceful_timeout: int = 30
+    # упавший воркер перезапускается с задержкой от restart_backoff, удваивающейся
+    # с каждым падением в окне crash_window секунд; после max_worker_crashes падений
+    # в окне мастер останавливается, а не форкает воркеров в цикле
+    restart_backoff: float = 0.5
+    restart_backoff_max: float = 30
+    max_worker_crashes: int = 10
+    crash_window: float = 60
+    # соединений с основной бд на все воркеры вместе, делится поровну
+    db_connection_budget: int = 80
 
 
 class ApiPrefix(BaseModel):
@@ -18,8 +38,20 @@ class DatabaseConfig(BaseModel):
     url: PostgresDsn
     echo: bool = False
     echo_pool: bool = False
-    pool_size: int = 50
-    max_overflow: int = 10
+    # размер пула на один процесс: workers * (pool_size + max_overflow) должно
+    # укладываться в max_connections postgres с запасом
+    pool_size: int = 10
+    max_overflow: int = 5
+    pool_timeout: float = 10
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = False
+    statement_cache_size: int = 100
+    statement_timeout_ms: int | None = None
+    # реплики для чтения, пул каждой настраивается так же, как пул основной бд
+    replica_urls: list[PostgresDsn] = []
+    replica_selection: Literal["round_robin", "least_busy"] = "least_busy"
+    replica_eject_seconds: int = 30
+    read_your_writes_seconds: int = 5
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
         "uq": "uq_%(table_name)s_%(column_0_N_name)s",
@@ -35,11 +67,117 @@ class HashConfig(BaseSettings):
     access_token_lifetime: int
     refresh_token_lifetime: int
     secret: str
+    pool_kind: Literal["thread", "process"] = "thread"
+    pool_workers: int = 4
+    pool_max_pending: int = 256
+    token_cache_size: int = 10000
 
 
 class RedisConfig(BaseSettings):
     """Класс конфигурации redis"""
     url: str
+    max_connections: int = 50
+    # сколько ждать свободного соединения из пула, прежде чем вернуть ошибку
+    pool_timeout: float = 0.5
+    socket_timeout: float = 0.5
+    socket_connect_timeout: float = 0.5
+    health_check_interval: int = 30
+    retry_attempts: int = 2
+    retry_backoff_base: float = 0.01
+    retry_backoff_cap: float = 0.1
+    # sentinel вида host:port; если заданы, адрес мастера берётся у них, url не используется
+    sentinel_urls: list[str] = []
+    sentinel_master: str = "mymaster"
+
+
+class CacheConfig(BaseModel):
+    """Конфиг кеша задач в redis"""
+    task_ttl: int = 300
+    lock_timeout_ms: int = 2000
+    lock_poll_interval_ms: int = 20
+
+
+class AIConfig(BaseModel):
+    """Конфиг модели предсказания подзадач по названию задачи"""
+    model_path: str | None = None
+    backend: Literal["torch", "onnx"] = "torch"
+    quantize: bool = False
+    num_threads: int = 2
+    input_prefix: str = ""
+    separator: str = ";"
+    num_beams: int = 4
+    max_input_tokens: int = 64
+    max_new_tokens: int = 64
+    max_subtasks: int = 10
+    max_batch_size: int = 16
+    max_wait_ms: int = 10
+    max_queue_size: int = 256
+    model_version: str | None = None
+    cache_size: int = 10000
+    cache_ttl: int = 60 * 60 * 24 * 7
+
+
+class JobsConfig(BaseModel):
+    """Конфиг фоновой очереди генерации подзадач"""
+    batch_size: int = 32
+    poll_interval_ms: int = 500
+    max_attempts: int = 5
+    backoff_base_ms: int = 1000
+    backoff_max_ms: int = 60000
+    lease_timeout: int = 300
+    result_ttl: int = 60 * 60 * 24
+    # каждая подписка на события задания держит своё соединение из пула redis,
+    # поэтому их число на процесс ограничено с запасом до redis.max_connections
+    events_max_streams: int = 20
+    events_max_per_user: int = 2
+    events_max_duration: int = 300
+    events_heartbeat: int = 15
+
+
+class RemindersConfig(BaseModel):
+    """Конфиг периодической рассылки напоминаний о дедлайнах"""
+    interval: int = 60
+    lookahead_minutes: int = 60
+    batch_size: int = 1000
+    stream_maxlen: int = 100000
+
+
+class IdempotencyConfig(BaseModel):
+    """Конфиг ключей идемпотентности для создающих запросов"""
+    ttl: int = 60 * 60 * 24
+    # сколько повтор ждёт результата первого запроса, который ещё выполняется
+    lock_timeout_ms: int = 10000
+    poll_interval_ms: int = 50
+
+
+class RateLimit(BaseModel):
+    """Не больше requests запросов за скользящее окно в window секунд"""
+    requests: int
+    window: int
+
+
+class RouteRateLimit(BaseModel):
+    """Лимиты маршрута по айпи клиента и по аккаунту"""
+    ip: RateLimit | None = None
+    account: RateLimit | None = None
+
+
+class RateLimitConfig(BaseModel):
+    """Конфиг ограничения частоты запросов к маршрутам авторизации"""
+    enabled: bool = True
+    # сколько заблокированных ключей помнит процесс, чтобы отказывать без похода в redis
+    blocked_cache_size: int = 10000
+    # адреса и подсети прокси/балансировщиков, например ["10.0.0.0/8"]: за ними айпи
+    # клиента берётся из X-Forwarded-For, иначе все клиенты попадали бы в один лимит
+    trusted_proxies: list[str] = []
+    routes: dict[str, RouteRateLimit] = {
+        "login": RouteRateLimit(
+            ip=RateLimit(requests=30, window=60), account=RateLimit(requests=10, window=300)
+        ),
+        "register": RouteRateLimit(ip=RateLimit(requests=10, window=3600)),
+        "verify_password": RouteRateLimit(account=RateLimit(requests=5, window=300)),
+        "refresh": RouteRateLimit(ip=RateLimit(requests=60, window=60)),
+    }
 
 
 class Settings(BaseSettings):
@@ -55,6 +193,12 @@ class Settings(BaseSettings):
     database: DatabaseConfig
     hash: HashConfig
     redis: RedisConfig
+    cache: CacheConfig = CacheConfig()
+    ai: AIConfig = AIConfig()
+    jobs: JobsConfig = JobsConfig()
+    reminders: RemindersConfig = RemindersConfig()
+    rate_limit: RateLimitConfig = RateLimitConfig()
+    idempotency: IdempotencyConfig = IdempotencyConfig()
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,11 +1,82 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import itertools
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
+from metrics import register_collector
+from instrumentation import instrument_engine
+
+
+class PoolStats:
+    """Счётчики ожидания свободного соединения в пуле"""
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время ожидания соединения и таймауты"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose пересоздаёт пул, счётчики переходят в новый
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class Replica:
+    """
+    Реплика для чтения. При обрыве соединения или ошибке подключения реплика
+    исключается из выбора на eject_seconds, затем снова пробуется.
+    """
+    def __init__(self, engine: AsyncEngine, eject_seconds: int):
+        self.engine = engine
+        self.eject_seconds = eject_seconds
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.session_factory = async_sessionmaker(
+            bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
+        )
+        event.listen(engine.sync_engine, "handle_error", self._on_error)
+        instrument_engine(engine)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or context.connection is None:
+            self.ejected_until = time.monotonic() + self.eject_seconds
+            self.ejections += 1
 
 
 class DatabaseHelper:
     """
     Класс для работы с бд:
-    инициализация подключения, создания и получения сессий
+    инициализация подключения, создания и получения сессий.
+    Чтения можно направлять на реплики: read_session_factory выбирает здоровую
+    реплику по кругу или наименее занятую, а если здоровых нет - основную бд.
     """
     def __init__(
         self,
@@ -14,26 +85,109 @@ class DatabaseHelper:
         echo_pool: bool = False,
         pool_size: int = 5,
         max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = -1,
+        pool_pre_ping: bool = False,
+        statement_cache_size: int = 100,
+        statement_timeout_ms: int | None = None,
+        replica_urls: list[str] | None = None,
+        replica_selection: str = "least_busy",
+        replica_eject_seconds: int = 30,
     ):
-        self.engine = create_async_engine(
-            url=url,
+        connect_args = {"prepared_statement_cache_size": statement_cache_size}
+        if statement_timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(statement_timeout_ms)}
+        self.url = url
+        self.replica_urls = replica_urls or []
+        self.replica_eject_seconds = replica_eject_seconds
+        self.engine_options = dict(
             echo=echo,
             echo_pool=echo_pool,
+            poolclass=InstrumentedPool,
             pool_size=pool_size,
             max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+            connect_args=connect_args,
         )
+        self.replica_selection = replica_selection
+        self._round_robin = itertools.count()
+        self._create_engines()
+
+    def _create_engines(self) -> None:
+        self.engine = create_async_engine(url=self.url, **self.engine_options)
+        instrument_engine(self.engine)
 
         self.async_session_factory = async_sessionmaker(
             bind=self.engine, autoflush=False, autocommit=False, expire_on_commit=False
         )
+        self.replicas = [
+            Replica(
+                create_async_engine(url=replica_url, **self.engine_options),
+                self.replica_eject_seconds,
+            )
+            for replica_url in self.replica_urls
+        ]
+
+    def resize_pool(self, pool_size: int, max_overflow: int) -> None:
+        """
+        Пересоздание движков с другим размером пула. Вызывается до первых
+        подключений, например в мастер-процессе перед fork воркеров.
+        """
+        self.engine_options.update(pool_size=pool_size, max_overflow=max_overflow)
+        self._create_engines()
+
+    def after_fork(self) -> None:
+        """Соединения, унаследованные от родителя, не используются в дочернем процессе"""
+        self.engine.sync_engine.dispose(close=False)
+        for replica in self.replicas:
+            replica.engine.sync_engine.dispose(close=False)
 
     async def dispose(self):
         await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
 
     async def session_getter(self):
         async with self.async_session_factory() as session:
             yield session
 
+    def read_session_factory(self) -> async_sessionmaker:
+        """Фабрика сессий для чтения: здоровая реплика или основная бд"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.async_session_factory
+        if self.replica_selection == "round_robin":
+            replica = healthy[next(self._round_robin) % len(healthy)]
+        else:
+            replica = min(healthy, key=lambda replica: replica.engine.pool.checkedout())
+        return replica.session_factory
+
+    async def read_session_getter(self):
+        async with self.read_session_factory()() as session:
+            yield session
+
+    def stats(self) -> dict[str, float]:
+        pool = self.engine.pool
+        stats = pool.stats
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_ms_avg": round(stats.wait_total / stats.checkouts * 1000, 3) if stats.checkouts else 0,
+            "wait_ms_max": round(stats.wait_max * 1000, 3),
+        }
+
+    def replica_stats(self) -> dict[str, float]:
+        stats = {"healthy": sum(replica.healthy for replica in self.replicas)}
+        for index, replica in enumerate(self.replicas):
+            stats[f"replica_{index}_checked_out"] = replica.engine.pool.checkedout()
+            stats[f"replica_{index}_ejections"] = replica.ejections
+        return stats
+
 
 db_helper = DatabaseHelper(
     url=str(settings.database.url),
@@ -41,4 +195,15 @@ db_helper = DatabaseHelper(
     echo_pool=settings.database.echo_pool,
     pool_size=settings.database.pool_size,
     max_overflow=settings.database.max_overflow,
+    pool_timeout=settings.database.pool_timeout,
+    pool_recycle=settings.database.pool_recycle,
+    pool_pre_ping=settings.database.pool_pre_ping,
+    statement_cache_size=settings.database.statement_cache_size,
+    statement_timeout_ms=settings.database.statement_timeout_ms,
+    replica_urls=[str(url) for url in settings.database.replica_urls],
+    replica_selection=settings.database.replica_selection,
+    replica_eject_seconds=settings.database.replica_eject_seconds,
 )
+register_collector("database_pool", db_helper.stats)
+if db_helper.replicas:
+    register_collector("database_replicas", db_helper.replica_stats)
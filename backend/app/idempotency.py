@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Awaitable, Callable
+from fastapi import HTTPException, Response
+from redis.exceptions import RedisError
+from config import IdempotencyConfig, settings
+from metrics import register_collector
+from redis_client import get_redis
+
+
+# ответ сохраняется, только если лок всё ещё у этого запроса
+STORE_IF_LOCKED = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('DEL', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+# лок снимается, только если он ещё этого запроса
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class StoredResponse:
+    """Ответ первого запроса и отпечаток его тела"""
+    def __init__(self, fingerprint: str, status_code: int, body: str):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+
+    def dump(self) -> str:
+        return json.dumps([self.fingerprint, self.status_code, self.body])
+
+    @classmethod
+    def load(cls, raw: str) -> "StoredResponse":
+        return cls(*json.loads(raw))
+
+    def response(self, fingerprint: str, replayed: bool = True) -> Response:
+        if fingerprint != self.fingerprint:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used with a different request"
+            )
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"} if replayed else None,
+        )
+
+
+class Idempotency:
+    """
+    Повторы запроса с тем же заголовком Idempotency-Key получают первый ответ
+    из redis, обработчик выполняется один раз. Пока первый запрос выполняется,
+    повторы ждут его результата: в процессе - общий future, между процессами -
+    лок в redis. Сохраняются только успешные ответы, после ошибки запрос
+    с тем же ключом выполнится заново. Если redis недоступен, ключ игнорируется.
+    """
+    def __init__(self, config: IdempotencyConfig):
+        self.config = config
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(user_id: str, scope: str, idempotency_key: str) -> str:
+        return f"idempotency:{user_id}:{scope}:{idempotency_key}"
+
+    async def run(
+        self,
+        user_id: str,
+        scope: str,
+        idempotency_key: str | None,
+        payload: str,
+        handler: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        if idempotency_key is None:
+            return await handler()
+        fingerprint = hashlib.sha256(payload.encode()).hexdigest()
+        key = self._key(user_id, scope, idempotency_key)
+        try:
+            redis = await get_redis()
+            raw = await redis.get(key)
+        except RedisError:
+            self.errors += 1
+            return await handler()
+        if raw is not None:
+            self.replayed += 1
+            return StoredResponse.load(raw).response(fingerprint)
+        if key in self._inflight:
+            self.coalesced += 1
+            stored = await asyncio.shield(self._inflight[key])
+            return stored.response(fingerprint)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            stored, replayed = await self._run_locked(redis, key, fingerprint, handler)
+            future.set_result(stored)
+            return stored.response(fingerprint, replayed)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _run_locked(
+        self, redis, key: str, fingerprint: str, handler: Callable[[], Awaitable[Response]]
+    ) -> tuple[StoredResponse, bool]:
+        """Ответ и признак того, что он получен от другого процесса, а не выполнен здесь"""
+        token = uuid.uuid4().hex
+        lock_key = f"{key}:lock"
+        try:
+            locked = await redis.set(lock_key, token, nx=True, px=self.config.lock_timeout_ms)
+        except RedisError:
+            self.errors += 1
+            return await self._execute(handler, fingerprint), False
+        if not locked:
+            stored = await self._wait_for_response(redis, key)
+            if stored is None:
+                self.conflicts += 1
+                raise HTTPException(
+                    status_code=409, detail="Request with this Idempotency-Key is still in progress"
+                )
+            self.replayed += 1
+            return stored, True
+        try:
+            stored = await self._execute(handler, fingerprint)
+        except BaseException:
+            await self._release(redis, lock_key, token)
+            raise
+        if stored.status_code >= 400:
+            await self._release(redis, lock_key, token)
+            return stored, False
+        try:
+            store = redis.register_script(STORE_IF_LOCKED)
+            await store(keys=[key, lock_key], args=[token, stored.dump(), self.config.ttl])
+        except RedisError:
+            self.errors += 1
+        return stored, False
+
+    async def _execute(
+        self, handler: Callable[[], Awaitable[Response]], fingerprint: str
+    ) -> StoredResponse:
+        response = await handler()
+        self.executed += 1
+        return StoredResponse(fingerprint, response.status_code, response.body.decode())
+
+    async def _release(self, redis, lock_key: str, token: str) -> None:
+        try:
+            release = redis.register_script(RELEASE_LOCK)
+            await release(keys=[lock_key], args=[token])
+        except RedisError:
+            self.errors += 1
+
+    async def _wait_for_response(self, redis, key: str) -> StoredResponse | None:
+        """Ожидание ответа запроса, который держит лок в другом процессе"""
+        deadline = time.monotonic() + self.config.lock_timeout_ms / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.config.poll_interval_ms / 1000)
+            try:
+                raw = await redis.get(key)
+                if raw is not None:
+                    return StoredResponse.load(raw)
+                if not await redis.exists(f"{key}:lock"):
+                    return None
+            except RedisError:
+                self.errors += 1
+                return None
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+        }
+
+
+idempotency = Idempotency(settings.idempotency)
+register_collector("idempotency", idempotency.stats)
@@ -0,0 +1,124 @@
+import time
+from contextvars import ContextVar
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from metrics import counter, histogram
+
+
+http_request_duration = histogram(
+    "http_request_duration_seconds", "Время обработки запроса", ("method", "route", "status")
+)
+http_request_db_queries = histogram(
+    "http_request_db_queries",
+    "Количество запросов к бд за один http запрос",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+http_request_db_duration = histogram(
+    "http_request_db_duration_seconds", "Суммарное время запросов к бд за один http запрос", ("route",)
+)
+db_query_duration = histogram("db_query_duration_seconds", "Время одного запроса к бд")
+redis_command_duration = histogram(
+    "redis_command_duration_seconds", "Время команды или пайплайна redis", ("command",)
+)
+redis_errors = counter("redis_errors_total", "Ошибки команд redis", ("command",))
+
+
+class RequestStats:
+    """Счётчики запросов к бд в рамках одного http запроса"""
+    __slots__ = ("db_queries", "db_time")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+
+
+# greenlet sqlalchemy наследует контекст задачи, поэтому хуки бд видят объект запроса
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: гистограммы времени и статусов по шаблону маршрута
+    (/v1/task/retrieve/{task_id}, а не конкретный путь) и число и время
+    запросов к бд на запрос. Несовпавшие пути идут под меткой unmatched.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_request_duration.observe(elapsed, scope["method"], path, status)
+            http_request_db_queries.observe(stats.db_queries, path)
+            http_request_db_duration.observe(stats.db_time, path)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    db_query_duration.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += elapsed
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Замер времени запросов движка и учёт их в текущем http запросе"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            redis_errors.inc("PIPELINE")
+            raise
+        finally:
+            redis_command_duration.observe(time.perf_counter() - start, "PIPELINE")
+
+
+class InstrumentedRedis(Redis):
+    """Клиент redis, замеряющий время каждой команды и пайплайна"""
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            redis_errors.inc(command)
+            raise
+        finally:
+            redis_command_duration.observe(time.perf_counter() - start, command)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
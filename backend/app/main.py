@@ -1,24 +1,51 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
 import uvicorn
 from config import settings
 from api.user_router import router as user_router
 from api.task_router import router as task_router
+from api.metrics_router import router as metrics_router, prometheus_router
 from contextlib import asynccontextmanager
 from redis_client import redis_startup, redis_shutdown
+from password_hasher import password_hasher
+from ai.service import suggestion_service
+from instrumentation import MetricsMiddleware
 
 
 @asynccontextmanager 
 async def lifespan(app: FastAPI):
     await redis_startup()
+    await suggestion_service.start()
     yield
+    await suggestion_service.stop()
     await redis_shutdown()
+    password_hasher.shutdown()
 
 main_app = FastAPI(lifespan=lifespan)
+main_app.add_middleware(MetricsMiddleware)
+
+
+@main_app.exception_handler(RedisError)
+async def redis_error_handler(request: Request, exc: RedisError):
+    """Redis недоступен или пул исчерпан - клиент может повторить запрос"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable"},
+        headers={"Retry-After": "1"},
+    )
+
 
 main_app.include_router(user_router, prefix='/api')
 main_app.include_router(task_router, prefix='/api')
+main_app.include_router(metrics_router, prefix='/api')
+main_app.include_router(prometheus_router)
+
+if __name__ == "__main__" and settings.run.mode == "prod":
+    from runner import PreforkRunner
 
-if __name__ == "__main__":
+    PreforkRunner(settings.run, app=main_app).run()
+elif __name__ == "__main__":
     uvicorn.run(
         app='main:main_app',
         port=settings.run.port,
@@ -0,0 +1,119 @@
+import bisect
+from typing import Callable
+
+
+Collector = Callable[[], dict[str, float]]
+
+_collectors: dict[str, Collector] = {}
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def register_collector(name: str, collector: Collector) -> None:
+    """Регистрация функции, отдающей текущие значения метрик компонента"""
+    _collectors[name] = collector
+
+
+def collect() -> dict[str, dict[str, float]]:
+    """Сбор метрик со всех зарегистрированных компонентов"""
+    return {name: collector() for name, collector in _collectors.items()}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Счётчик в формате prometheus с набором меток"""
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма в формате prometheus с фиксированными границами корзин.
+    observe - поиск корзины бинарным поиском, накопленные суммы считаются только при выдаче.
+    """
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # метки -> [счётчики корзин (+Inf последним), сумма, количество]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+_metrics: list[Counter | Histogram] = []
+
+
+def counter(name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, help, labels)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(
+    name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+) -> Histogram:
+    metric = Histogram(name, help, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    """Все метрики в текстовом формате prometheus, значения коллекторов - как gauge"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for component, values in collect().items():
+        for key, value in values.items():
+            name = f"{component}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,15 +1,30 @@
 from typing import List
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import MetaData, DateTime, func, ForeignKey
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    mapped_column,
+    query_expression,
+    relationship,
+)
+from sqlalchemy import MetaData, DateTime, func, ForeignKey, Index, text, Computed
 from config import settings
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+
+
+# условие частичных индексов по дедлайнам, запросы должны повторять его дословно
+OPEN_DEADLINE = "NOT is_completed AND deadline IS NOT NULL"
+
+# конфигурация полнотекстового поиска, запросы должны строить tsquery с ней же
+SEARCH_CONFIG = "russian"
 
 
 class Base(DeclarativeBase):
     """Базовый абстрактный класс для всех моделей"""
 
     __abstract__ = True
+    # created_at/updated_at считаются в бд, RETURNING сразу возвращает их после INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
 
     metadata = MetaData(naming_convention=settings.database.naming_convention)
     id: Mapped[uuid.UUID] = mapped_column(
@@ -32,7 +47,18 @@ class SubTask(Base):
 
     parent: Mapped["Task"] = relationship(back_populates="subtasks")
     parent_id: Mapped[uuid.UUID | None] = mapped_column(
-        ForeignKey("tasks.id", ondelete="CASCADE")
+        ForeignKey("tasks.id", ondelete="CASCADE"), index=True
+    )
+
+    # вычисляется в бд, в обычных запросах не загружается
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', name)", persisted=True),
+        deferred=True,
+    )
+
+    __table_args__ = (
+        Index("ix_subtasks_search_vector", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -40,6 +66,20 @@ class Task(Base):
     """Класс задач с дедлайном и флагом на публичность"""
 
     __tablename__ = "tasks"
+    __table_args__ = (
+        # индекс под keyset-пагинацию списка задач пользователя
+        Index("ix_tasks_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        # частичные индексы только по открытым задачам с дедлайном:
+        # ближайшие и просроченные задачи пользователя и обход всех дедлайнов напоминаниями
+        Index(
+            "ix_tasks_owner_id_deadline_open",
+            "owner_id",
+            "deadline",
+            postgresql_where=text(OPEN_DEADLINE),
+        ),
+        Index("ix_tasks_deadline_id_open", "deadline", "id", postgresql_where=text(OPEN_DEADLINE)),
+        Index("ix_tasks_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     name: Mapped[str] = mapped_column()
     description: Mapped[str | None] = None
@@ -54,7 +94,26 @@ class Task(Base):
     )
     is_completed: Mapped[bool] = mapped_column(default=False)
 
-    subtasks: Mapped[List["SubTask"]] = relationship(back_populates="parent")
+    subtasks: Mapped[List["SubTask"]] = relationship(
+        back_populates="parent", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    # название весит больше описания при ранжировании результатов поиска
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+    # заполняется только в результатах поиска
+    search_rank: Mapped[float | None] = query_expression()
+
+    # денормализованные счётчики подзадач, меняются в одной транзакции с подзадачами
+    subtask_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    completed_subtask_count: Mapped[int] = mapped_column(default=0, server_default="0")
 
 
 class User(Base):
@@ -68,3 +127,6 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column()
 
     tasks: Mapped[List["Task"]] = relationship(back_populates="owner")
+
+    # заполняется только при загрузке с LoadProfile.SUMMARY
+    task_count: Mapped[int | None] = query_expression()
@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from config import settings
+from metrics import register_collector
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Пул для хеширования и проверки паролей вне event loop.
+    bcrypt занимает сотни миллисекунд CPU, поэтому вызовы уходят в отдельный
+    пул потоков или процессов, а семафор ограничивает число одновременных операций.
+    Если очередь ожидающих переполнена, запрос сразу отклоняется с 503.
+    """
+    def __init__(
+        self,
+        kind: str = "thread",
+        workers: int = 4,
+        max_pending: int = 256,
+    ):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hasher"
+                )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, try again later")
+        self.pending += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.pending -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    kind=settings.hash.pool_kind,
+    workers=settings.hash.pool_workers,
+    max_pending=settings.hash.pool_max_pending,
+)
+register_collector("password_hasher", password_hasher.stats)
@@ -0,0 +1,183 @@
+import ipaddress
+import time
+from collections import OrderedDict
+from typing import Literal
+from fastapi import HTTPException, Request
+from redis.exceptions import RedisError
+from auth import api_key_header
+from config import RateLimit, RateLimitConfig, settings
+from metrics import register_collector
+from redis_client import get_redis
+
+
+# Скользящее окно по двум счётчикам: текущего и предыдущего фиксированного окна,
+# предыдущий учитывается с весом оставшейся доли окна.
+# KEYS - пары (текущее окно, предыдущее окно) для каждого лимита
+# ARGV[1] - текущее время, затем для каждого лимита requests и window
+# Возвращает {0, 0}, если все лимиты пропускают запрос (и тогда учитывает его),
+# иначе {номер нарушенного лимита, через сколько секунд можно повторить}
+SLIDING_WINDOW = """
+local now = tonumber(ARGV[1])
+local limits = #KEYS / 2
+for i = 1, limits do
+    local requests = tonumber(ARGV[2 * i])
+    local window = tonumber(ARGV[2 * i + 1])
+    local elapsed = now % window
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    if previous * (window - elapsed) / window + current + 1 > requests then
+        local wait
+        if current + 1 > requests then
+            wait = window - elapsed + window * (1 - (requests - 1) / current)
+        else
+            wait = window * (1 - (requests - 1 - current) / previous) - elapsed
+        end
+        return {i, math.max(1, math.ceil(wait))}
+    end
+end
+for i = 1, limits do
+    redis.call('INCR', KEYS[2 * i - 1])
+    redis.call('EXPIRE', KEYS[2 * i - 1], 2 * tonumber(ARGV[2 * i + 1]))
+end
+return {0, 0}
+"""
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов к маршрутам по айпи клиента и по аккаунту.
+    Все лимиты запроса проверяются и учитываются одним вызовом lua-скрипта.
+    Отказы запоминаются в процессе до истечения блокировки, поэтому повторные
+    запросы от заблокированного ключа отклоняются без похода в redis.
+    Если redis недоступен, запросы пропускаются.
+    """
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self._trusted_proxies = [
+            ipaddress.ip_network(proxy, strict=False) for proxy in config.trusted_proxies
+        ]
+        self._blocked: OrderedDict[str, float] = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.local_rejects = 0
+        self.errors = 0
+
+    def _is_trusted_proxy(self, host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self._trusted_proxies)
+
+    def client_ip(self, request: Request) -> str | None:
+        """
+        Айпи клиента. Если запрос пришёл от доверенного прокси, это первый справа
+        адрес в X-Forwarded-For, не принадлежащий прокси: левые адреса заголовка
+        клиент может подставить сам.
+        """
+        if request.client is None:
+            return None
+        ip = request.client.host
+        if not self._is_trusted_proxy(ip):
+            return ip
+        forwarded = request.headers.get("x-forwarded-for", "")
+        for hop in reversed([hop.strip() for hop in forwarded.split(",") if hop.strip()]):
+            ip = hop
+            if not self._is_trusted_proxy(hop):
+                break
+        return ip
+
+    def _blocked_for(self, keys: list[str]) -> float:
+        now = time.monotonic()
+        for key in keys:
+            until = self._blocked.get(key)
+            if until is None:
+                continue
+            if until > now:
+                return until - now
+            del self._blocked[key]
+        return 0.0
+
+    def _block(self, key: str, seconds: int) -> None:
+        self._blocked[key] = time.monotonic() + seconds
+        self._blocked.move_to_end(key)
+        if len(self._blocked) > self.config.blocked_cache_size:
+            self._blocked.popitem(last=False)
+
+    async def hit(self, route: str, ip: str | None, account: str | None) -> None:
+        """Учёт запроса к маршруту, 429 если какой-то из лимитов исчерпан"""
+        limits = self.config.routes.get(route)
+        if not self.config.enabled or limits is None:
+            return
+        checks: list[tuple[str, RateLimit]] = []
+        if limits.ip is not None and ip is not None:
+            checks.append((f"rate:{route}:ip:{ip}", limits.ip))
+        if limits.account is not None and account is not None:
+            checks.append((f"rate:{route}:account:{account}", limits.account))
+        if not checks:
+            return
+        wait = self._blocked_for([key for key, _ in checks])
+        if wait:
+            self.local_rejects += 1
+            self._reject(int(wait) + 1)
+        now = time.time()
+        keys, args = [], [now]
+        for key, limit in checks:
+            window = int(now // limit.window)
+            keys.extend((f"{key}:{window}", f"{key}:{window - 1}"))
+            args.extend((limit.requests, limit.window))
+        try:
+            redis = await get_redis()
+            script = redis.register_script(SLIDING_WINDOW)
+            violated, retry_after = await script(keys=keys, args=args)
+        except RedisError:
+            self.errors += 1
+            return
+        if violated:
+            self._block(checks[violated - 1][0], retry_after)
+            self.rejected += 1
+            self._reject(retry_after)
+        self.allowed += 1
+
+    @staticmethod
+    def _reject(retry_after: int):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "local_rejects": self.local_rejects,
+            "errors": self.errors,
+            "blocked_keys": len(self._blocked),
+        }
+
+
+rate_limiter = RateLimiter(settings.rate_limit)
+register_collector("rate_limit", rate_limiter.stats)
+
+
+def rate_limit(route: str, account: Literal["email", "user"] | None = None):
+    """
+    Зависимость маршрута: лимиты берутся из settings.rate_limit.routes[route].
+    Аккаунт - поле email из тела запроса или юзер из токена авторизации.
+    Зависимость выполняется до обработчика, то есть до хеширования пароля.
+    """
+    async def dependency(request: Request) -> None:
+        key = None
+        if account == "email":
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and isinstance(body.get("email"), str):
+                key = body["email"].strip().lower()
+        elif account == "user":
+            key = await api_key_header(request.headers.get("authorization", ""))
+        await rate_limiter.hit(route, rate_limiter.client_ip(request), key)
+
+    return dependency
@@ -1,25 +1,148 @@
-from redis.asyncio import Redis
-from config import settings
+import asyncio
+import time
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.connection import parse_url
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import Sentinel, SentinelConnectionPool
+from redis.backoff import ExponentialWithJitterBackoff
+from redis.exceptions import ConnectionError, RedisError, TimeoutError
+from config import RedisConfig, settings
+from instrumentation import InstrumentedRedis
+from metrics import register_collector
 
 redis: Redis | None = None
 
 
+class RedisUnavailable(RedisError):
+    """Клиент redis не создан: redis_startup не вызывался или упал при создании"""
+
+
+class PoolTiming:
+    """
+    Ожидание свободного соединения в пуле. Пул ограничен max_connections и
+    ждёт не дольше pool_timeout, поэтому при всплеске нагрузки запросы
+    встают в очередь, а не открывают всё новые соединения к redis.
+    """
+    def _init_stats(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except ConnectionError as error:
+            if isinstance(error.__cause__, asyncio.TimeoutError):
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return connection
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+
+class InstrumentedPool(PoolTiming, BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_stats()
+
+
+class InstrumentedSentinelPool(PoolTiming, SentinelConnectionPool, BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_stats()
+
+
+def create_redis(config: RedisConfig) -> Redis:
+    """
+    Клиент с ограниченным пулом, таймаутами на сокет и повтором команды с
+    экспоненциальной задержкой при обрыве соединения или таймауте.
+    Redis Cluster не поддерживается: lua-скрипты работают с ключами из разных слотов.
+    """
+    options = dict(
+        max_connections=config.max_connections,
+        timeout=config.pool_timeout,
+        socket_timeout=config.socket_timeout,
+        socket_connect_timeout=config.socket_connect_timeout,
+        health_check_interval=config.health_check_interval,
+        retry=Retry(
+            ExponentialWithJitterBackoff(cap=config.retry_backoff_cap, base=config.retry_backoff_base),
+            config.retry_attempts,
+        ),
+        retry_on_error=[ConnectionError, TimeoutError],
+        decode_responses=True,
+    )
+    if not config.sentinel_urls:
+        return InstrumentedRedis.from_pool(InstrumentedPool.from_url(config.url, **options))
+    # пароль и номер бд для мастера берутся из url
+    url_options = {key: value for key, value in parse_url(config.url).items() if key in ("username", "password", "db")}
+    sentinels = []
+    for address in config.sentinel_urls:
+        host, _, port = address.rpartition(":")
+        sentinels.append((host, int(port)))
+    sentinel = Sentinel(
+        sentinels,
+        socket_timeout=config.socket_timeout,
+        socket_connect_timeout=config.socket_connect_timeout,
+    )
+    return sentinel.master_for(
+        config.sentinel_master,
+        redis_class=InstrumentedRedis,
+        connection_pool_class=InstrumentedSentinelPool,
+        **url_options,
+        **options,
+    )
+
+
+def pool_stats() -> dict:
+    # значения коллекторов уходят в prometheus как gauge, поэтому только числа
+    if redis is None:
+        return {"connected": 0}
+    pool = redis.connection_pool
+    return {"connected": 1, **(pool.stats() if isinstance(pool, PoolTiming) else {})}
+
+
+register_collector("redis_pool", pool_stats)
+
+
 async def redis_startup():
+    """
+    Клиент создаётся, даже если redis сейчас недоступен: соединения
+    открываются при первой команде, и приложение восстановится само,
+    когда redis вернётся. До этого команды завершаются RedisError.
+    """
     global redis
+    redis = create_redis(settings.redis)
     try:
-        redis = Redis.from_url(str(settings.redis.url), decode_responses=True)
         await redis.ping()
         print("Redis connection opened.")
-    except Exception:
+    except RedisError:
         print("Redis connection failed.")
 
 
 async def redis_shutdown():
     global redis
     if redis:
-        await redis.close()
+        await redis.aclose()
+        redis = None
         print("Redis connection closed.")
 
 
 async def get_redis() -> Redis:
-    return redis
\ No newline at end of file
+    if redis is None:
+        raise RedisUnavailable("Redis client is not initialized")
+    return redis
@@ -0,0 +1,101 @@
+import asyncio
+import signal
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, tuple_
+from config import RemindersConfig, settings
+from database import db_helper
+from models import Task
+from redis_client import get_redis, redis_startup, redis_shutdown
+
+
+class ReminderSweeper:
+    """
+    Периодический обход дедлайнов всех пользователей. За проход пачками по (deadline, id)
+    читаются открытые задачи, дедлайн которых вошёл в окно напоминания после прошлого
+    прохода, и для каждой пачки одним пайплайном пишутся события в redis stream.
+    Граница прошлого прохода хранится в redis и сдвигается только после успешного
+    прохода, поэтому при сбое напоминания могут повториться, но не потеряются.
+    """
+    def __init__(self, config: RemindersConfig, prefix: str = "reminders"):
+        self.config = config
+        self.stream_key = f"{prefix}:events"
+        self.watermark_key = f"{prefix}:watermark"
+        self.lock_key = f"{prefix}:lock"
+        self._stopped = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def sweep(self, now: datetime | None = None) -> int:
+        """Один проход, возвращает количество отправленных напоминаний"""
+        redis = await get_redis()
+        # проход выполняет только один экземпляр
+        if not await redis.set(self.lock_key, "1", nx=True, ex=self.config.interval):
+            return 0
+        now = now or datetime.now(timezone.utc)
+        horizon = now + timedelta(minutes=self.config.lookahead_minutes)
+        watermark = await redis.get(self.watermark_key)
+        start = datetime.fromtimestamp(float(watermark), timezone.utc) if watermark else now
+        sent = 0
+        cursor = None
+        async with db_helper.async_session_factory() as session:
+            while start < horizon:
+                # условия повторяют предикат частичного индекса ix_tasks_deadline_id_open
+                query = select(Task.id, Task.owner_id, Task.name, Task.deadline).where(
+                    ~Task.is_completed,
+                    Task.deadline.is_not(None),
+                    Task.deadline > start,
+                    Task.deadline <= horizon,
+                )
+                if cursor is not None:
+                    query = query.where(tuple_(Task.deadline, Task.id) > cursor)
+                query = query.order_by(Task.deadline, Task.id).limit(self.config.batch_size)
+                rows = (await session.execute(query)).all()
+                if rows:
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for id, owner_id, name, deadline in rows:
+                            pipe.xadd(
+                                self.stream_key,
+                                {
+                                    "task_id": str(id),
+                                    "owner_id": str(owner_id),
+                                    "name": name,
+                                    "deadline": deadline.isoformat(),
+                                },
+                                maxlen=self.config.stream_maxlen,
+                                approximate=True,
+                            )
+                        await pipe.execute()
+                    sent += len(rows)
+                    cursor = (rows[-1].deadline, rows[-1].id)
+                if len(rows) < self.config.batch_size:
+                    break
+        await redis.set(self.watermark_key, horizon.timestamp())
+        return sent
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            sent = await self.sweep()
+            if sent:
+                print(f"Reminders sent: {sent}")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.config.interval)
+            except TimeoutError:
+                pass
+
+
+async def main():
+    await redis_startup()
+    sweeper = ReminderSweeper(settings.reminders)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, sweeper.stop)
+    try:
+        await sweeper.run()
+    finally:
+        await redis_shutdown()
+        await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
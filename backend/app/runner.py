@@ -0,0 +1,233 @@
+"""
+Продакшн запуск: python runner.py (или python main.py с BACKEND__RUN__MODE=prod).
+"""
+import asyncio
+import gc
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from collections import deque
+import uvicorn
+from config import RunConfig, settings
+from metrics import register_collector
+
+
+def rss_mb(pid: int) -> float:
+    """Резидентная память процесса по /proc, 0 если недоступно"""
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def pool_sizes(budget: int, workers: int) -> tuple[int, int]:
+    """Размер пула и overflow на воркер так, чтобы все воркеры укладывались в бюджет соединений"""
+    per_worker = max(budget // workers, 2)
+    max_overflow = per_worker // 4
+    return per_worker - max_overflow, max_overflow
+
+
+class PreforkRunner:
+    """
+    Мастер-процесс: один раз импортирует приложение и загружает модель,
+    открывает сокет и форкает воркеров, которые делят память предзагрузки
+    через copy-on-write. Воркер перезапускается после max_requests запросов
+    (с разбросом, чтобы не все сразу) или при превышении max_memory_mb:
+    ему отправляется SIGTERM, он дообрабатывает начатые запросы, а замена
+    запускается сразу. Упавший воркер перезапускается с нарастающей задержкой,
+    при частых падениях мастер завершается с ошибкой.
+    """
+    def __init__(self, config: RunConfig, app=None):
+        self.config = config
+        self.app = app
+        self.workers = config.workers or os.cpu_count() or 1
+        self.children: dict[int, float] = {}
+        self.retiring: dict[int, float] = {}
+        self.socket: socket.socket | None = None
+        self.stopping = False
+        self.failed = False
+        self.crashes: deque[float] = deque()
+        self.pending_spawns: list[float] = []
+
+    def preload(self) -> None:
+        start = time.perf_counter()
+        from database import db_helper
+
+        pool_size, max_overflow = pool_sizes(self.config.db_connection_budget, self.workers)
+        db_helper.resize_pool(pool_size, max_overflow)
+        if self.app is None:
+            from main import main_app
+
+            self.app = main_app
+        from ai.service import suggestion_service
+
+        if self.config.preload_model and suggestion_service.is_enabled:
+            try:
+                suggestion_service.model.load()
+            except Exception as e:
+                # воркеры попробуют загрузить модель сами и без неё отвечают 503
+                print(f"Subtask model preload failed: {e!r}")
+        # объекты предзагрузки больше не трогает сборщик мусора, и их страницы остаются общими
+        gc.collect()
+        gc.freeze()
+        print(
+            f"Preloaded in {time.perf_counter() - start:.2f}s, master rss {rss_mb(os.getpid()):.0f} MB, "
+            f"{self.workers} workers, db pool {pool_size}+{max_overflow} per worker"
+        )
+
+    def bind(self) -> None:
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.config.host, self.config.port))
+        self.socket.listen(self.config.backlog)
+        self.socket.set_inheritable(True)
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        try:
+            started = self._serve_worker()
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        # 3 - как у uvicorn при ошибке запуска приложения
+        os._exit(0 if started else 3)
+
+    def _serve_worker(self) -> bool:
+        """Обслуживание запросов в воркере, False если приложение не запустилось"""
+        forked_at = time.perf_counter()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        from database import db_helper
+
+        db_helper.after_fork()
+        started = time.time()
+        register_collector(
+            "process",
+            lambda: {"pid": os.getpid(), "rss_mb": round(rss_mb(os.getpid()), 1), "uptime": time.time() - started},
+        )
+        max_requests = self.config.max_requests + random.randint(0, self.config.max_requests_jitter)
+        server = uvicorn.Server(
+            uvicorn.Config(
+                self.app,
+                limit_max_requests=max_requests or None,
+                timeout_graceful_shutdown=self.config.graceful_timeout,
+            )
+        )
+
+        async def serve() -> None:
+            task = asyncio.create_task(server.serve(sockets=[self.socket]))
+            while not server.started and not task.done():
+                await asyncio.sleep(0.05)
+            if server.started:
+                print(
+                    f"Worker {os.getpid()} ready in {time.perf_counter() - forked_at:.2f}s, "
+                    f"rss {rss_mb(os.getpid()):.0f} MB"
+                )
+            await task
+            return server.started
+
+        return asyncio.run(serve())
+
+    def _stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _reap(self) -> None:
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            self.children.pop(pid, None)
+            if self.retiring.pop(pid, None) is not None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0:
+                # воркер отработал max_requests - замена сразу
+                print(f"Worker {pid} exited, restarting")
+                self.spawn()
+            else:
+                self._worker_crashed(pid, code)
+
+    def _worker_crashed(self, pid: int, code: int) -> None:
+        now = time.monotonic()
+        self.crashes.append(now)
+        while now - self.crashes[0] > self.config.crash_window:
+            self.crashes.popleft()
+        if len(self.crashes) >= self.config.max_worker_crashes:
+            print(f"{len(self.crashes)} worker crashes in {self.config.crash_window:.0f}s, stopping")
+            self.failed = True
+            self.stopping = True
+            return
+        delay = min(
+            self.config.restart_backoff * 2 ** (len(self.crashes) - 1), self.config.restart_backoff_max
+        )
+        print(f"Worker {pid} crashed with code {code}, restarting in {delay:.1f}s")
+        self.pending_spawns.append(now + delay)
+
+    def _spawn_pending(self) -> None:
+        now = time.monotonic()
+        due = [at for at in self.pending_spawns if at <= now]
+        self.pending_spawns = [at for at in self.pending_spawns if at > now]
+        for _ in due:
+            self.spawn()
+
+    def _check_memory(self) -> None:
+        if self.config.max_memory_mb is None:
+            return
+        for pid in list(self.children):
+            if pid in self.retiring:
+                continue
+            rss = rss_mb(pid)
+            if rss > self.config.max_memory_mb:
+                print(f"Worker {pid} uses {rss:.0f} MB, recycling")
+                self.retiring[pid] = time.monotonic()
+                os.kill(pid, signal.SIGTERM)
+                self.spawn()
+
+    def _shutdown(self) -> None:
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.config.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self) -> None:
+        self.preload()
+        self.bind()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for _ in range(self.workers):
+            self.spawn()
+        last_check = time.monotonic()
+        while not self.stopping:
+            self._reap()
+            self._spawn_pending()
+            now = time.monotonic()
+            if now - last_check >= self.config.memory_check_interval:
+                self._check_memory()
+                # воркер, не успевший завершиться за graceful_timeout, добивается
+                for pid, since in list(self.retiring.items()):
+                    if now - since > self.config.graceful_timeout + 5 and pid in self.children:
+                        os.kill(pid, signal.SIGKILL)
+                last_check = now
+            time.sleep(0.2)
+        self._shutdown()
+        if self.failed:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    PreforkRunner(settings.run).run()
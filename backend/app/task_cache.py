@@ -0,0 +1,173 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from redis.exceptions import RedisError
+from config import settings
+from metrics import register_collector
+from redis_client import get_redis
+
+
+# при изменении формата сериализации задачи версию нужно поднять,
+# чтобы старые записи кеша просто перестали читаться
+CACHE_VERSION = 3
+
+# значение пишется в кеш только если лок всё ещё наш:
+# инвалидация удаляет лок, и устаревшая загрузка не перезапишет свежие данные
+STORE_IF_LOCKED = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('DEL', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+@dataclass
+class CachedTask:
+    """Сериализованная задача и поля, нужные для проверки доступа к ней"""
+    owner_id: str
+    is_public: bool
+    body: str
+
+    def dump(self) -> str:
+        return f"{self.owner_id} {int(self.is_public)}\n{self.body}"
+
+    @classmethod
+    def load(cls, raw: str) -> "CachedTask":
+        header, body = raw.split("\n", 1)
+        owner_id, is_public = header.split(" ")
+        return cls(owner_id=owner_id, is_public=is_public == "1", body=body)
+
+
+class TaskCache:
+    """
+    Read-through кеш сериализованных задач в redis.
+    Промах загружает задачу одним загрузчиком на ключ: внутри процесса
+    остальные запросы ждут тот же future, между процессами - лок в redis,
+    поэтому популярная задача после инвалидации не обрушит бд запросами.
+    """
+    def __init__(self, ttl: int, lock_timeout_ms: int, lock_poll_interval_ms: int):
+        self.ttl = ttl
+        self.lock_timeout_ms = lock_timeout_ms
+        self.lock_poll_interval = lock_poll_interval_ms / 1000
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock_waits = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:v{CACHE_VERSION}:{task_id}"
+
+    @staticmethod
+    def _lock_key(task_id: str) -> str:
+        return f"task:v{CACHE_VERSION}:{task_id}:lock"
+
+    async def get_or_load(
+        self, task_id: str, loader: Callable[[], Awaitable[CachedTask]]
+    ) -> CachedTask:
+        try:
+            redis = await get_redis()
+            raw = await redis.get(self._key(task_id))
+        except RedisError:
+            self.errors += 1
+            return await loader()
+        if raw is not None:
+            self.hits += 1
+            return CachedTask.load(raw)
+        self.misses += 1
+        if task_id in self._inflight:
+            return await asyncio.shield(self._inflight[task_id])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[task_id] = future
+        try:
+            task = await self._load_locked(redis, task_id, loader)
+            future.set_result(task)
+            return task
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[task_id]
+
+    async def _load_locked(
+        self, redis, task_id: str, loader: Callable[[], Awaitable[CachedTask]]
+    ) -> CachedTask:
+        token = uuid.uuid4().hex
+        try:
+            locked = await redis.set(
+                self._lock_key(task_id), token, nx=True, px=self.lock_timeout_ms
+            )
+        except RedisError:
+            self.errors += 1
+            return await loader()
+        if not locked:
+            cached = await self._wait_for_value(redis, task_id)
+            if cached is not None:
+                return cached
+            return await loader()
+        try:
+            task = await loader()
+        except BaseException:
+            await redis.delete(self._lock_key(task_id))
+            raise
+        try:
+            store = redis.register_script(STORE_IF_LOCKED)
+            await store(
+                keys=[self._key(task_id), self._lock_key(task_id)],
+                args=[token, task.dump(), self.ttl],
+            )
+        except RedisError:
+            self.errors += 1
+        return task
+
+    async def _wait_for_value(self, redis, task_id: str) -> CachedTask | None:
+        """Ожидание, пока задачу загрузит процесс, который держит лок"""
+        self.lock_waits += 1
+        deadline = time.monotonic() + self.lock_timeout_ms / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            try:
+                raw = await redis.get(self._key(task_id))
+            except RedisError:
+                self.errors += 1
+                return None
+            if raw is not None:
+                return CachedTask.load(raw)
+        return None
+
+    async def invalidate(self, *task_ids) -> None:
+        """Удаление задач из кеша вместе с локами незавершённых загрузок"""
+        keys = []
+        for task_id in task_ids:
+            keys.extend((self._key(str(task_id)), self._lock_key(str(task_id))))
+        if not keys:
+            return
+        try:
+            redis = await get_redis()
+            await redis.delete(*keys)
+        except RedisError:
+            self.errors += 1
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "lock_waits": self.lock_waits,
+            "errors": self.errors,
+        }
+
+
+task_cache = TaskCache(
+    ttl=settings.cache.task_ttl,
+    lock_timeout_ms=settings.cache.lock_timeout_ms,
+    lock_poll_interval_ms=settings.cache.lock_poll_interval_ms,
+)
+register_collector("task_cache", task_cache.stats)
@@ -0,0 +1,65 @@
+import hashlib
+import time
+from collections import OrderedDict
+from config import settings
+from metrics import register_collector
+
+
+class TokenCache:
+    """
+    LRU-кеш уже проверенных access токенов.
+    Ключ - sha256 токена, запись живёт до его exp, так что повторные запросы
+    с тем же токеном не проверяют подпись заново. max_size=0 выключает кеш.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        payload = self._entries.get(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        if payload["exp"] <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[self._key(token)] = payload
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+token_cache = TokenCache(max_size=settings.hash.token_cache_size)
+register_collector("token_cache", token_cache.stats)
@@ -0,0 +1,112 @@
+import asyncio
+import signal
+import uuid
+from sqlalchemy import insert, select
+from config import settings
+from database import db_helper
+from models import Task, SubTask
+from redis_client import redis_startup, redis_shutdown
+from task_cache import task_cache
+from api.utils import adjust_subtask_counters
+from ai.jobs import SubtaskJobQueue, subtask_jobs
+from ai.service import suggestion_service
+
+
+class SubtaskJobWorker:
+    """
+    Воркер фоновой генерации подзадач: забирает задания пачками, получает
+    подсказки модели (запросы пачки батчатся сервисом подсказок) и вставляет
+    подзадачи всех заданий пачки одним INSERT в одной транзакции.
+    """
+    def __init__(self, queue: SubtaskJobQueue, batch_size: int, poll_interval_ms: int):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval_ms / 1000
+        self._stopped = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def process(self, jobs: list[dict]) -> None:
+        predictions = await asyncio.gather(
+            *(suggestion_service.suggest(job.get("name", "")) for job in jobs),
+            return_exceptions=True,
+        )
+        failed = [job for job, result in zip(jobs, predictions) if isinstance(result, BaseException)]
+        if failed:
+            await self.queue.fail(failed, "Subtask prediction failed")
+        results = {
+            job["id"]: result
+            for job, result in zip(jobs, predictions)
+            if not isinstance(result, BaseException)
+        }
+        if not results:
+            return
+        try:
+            changed = await self.save(results)
+        except Exception as e:
+            await self.queue.fail([job for job in jobs if job["id"] in results], str(e))
+            return
+        await self.queue.complete(results)
+        await task_cache.invalidate(*changed)
+
+    async def save(self, results: dict[str, list[str]]) -> list[uuid.UUID]:
+        async with db_helper.async_session_factory() as session:
+            # подзадачи добавляются только существующим задачам без подзадач,
+            # поэтому повтор задания после сбоя не создаст дубликаты
+            task_ids = await session.scalars(
+                select(Task.id)
+                .where(
+                    Task.id.in_([uuid.UUID(job_id) for job_id in results]),
+                    Task.subtask_count == 0,
+                )
+                .with_for_update()
+            )
+            task_ids = list(task_ids)
+            rows = [
+                {"id": uuid.uuid4(), "parent_id": task_id, "name": name}
+                for task_id in task_ids
+                for name in results[str(task_id)]
+            ]
+            if rows:
+                await session.execute(insert(SubTask), rows)
+            await adjust_subtask_counters(
+                session,
+                {task_id: (len(results[str(task_id)]), 0) for task_id in task_ids},
+            )
+            await session.commit()
+        return task_ids
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            jobs = await self.queue.pop_batch(self.batch_size)
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+            await self.process(jobs)
+
+
+async def main():
+    await redis_startup()
+    await suggestion_service.start()
+    worker = SubtaskJobWorker(
+        subtask_jobs,
+        batch_size=settings.jobs.batch_size,
+        poll_interval_ms=settings.jobs.poll_interval_ms,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await suggestion_service.stop()
+        await redis_shutdown()
+        await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,252 @@
+"""
+Нагрузочный бенчмарк API в одном процессе: приложение вызывается через
+httpx.ASGITransport без сети, данные готовит datagen.py, для каждого сценария
+и уровня параллельности считаются RPS и перцентили задержки.
+Нужен postgres из BACKEND__DATABASE__URL, redis - настоящий или fakeredis (--fake-redis).
+
+Запуск из папки backend:
+    python benchmarks/bench_api.py --users 50 --concurrency 1,8,32 --output result.json
+    python benchmarks/bench_api.py --baseline baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import _setup  # noqa: F401
+import httpx
+import datagen
+import redis_client
+from auth import create_tokens
+from database import db_helper
+from main import main_app
+
+
+class Context:
+    """Общие данные сценариев: пользователи с токенами и задачами"""
+    def __init__(self, users: list[dict], seed: int):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.registered = 0
+
+    def user(self) -> dict:
+        return self.rng.choice(self.users)
+
+    async def worker_tokens(self, index: int) -> dict:
+        """
+        Своя пара токенов для воркера: рефреш токен одноразовый, и два воркера
+        с одним токеном получали бы 401 у того, кто обновит его вторым
+        """
+        user = self.users[index % len(self.users)]
+        access, refresh = await create_tokens({"id": user["id"], "email": user["email"]})
+        return {"access": access, "refresh": refresh}
+
+    def auth(self, user: dict) -> dict:
+        return {"Authorization": f"Bearer {user['access']}"}
+
+
+async def register(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    ctx.registered += 1
+    response = await client.post(
+        "/api/v1/user/register",
+        json={
+            "email": f"bench-new-{time.time_ns()}-{ctx.registered}@{datagen.EMAIL_DOMAIN}",
+            "password": datagen.PASSWORD,
+            "name": "Тест",
+            "last_name": "Нагрузкин",
+        },
+    )
+    return response.status_code
+
+
+async def login(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    response = await client.post(
+        "/api/v1/user/login", json={"email": ctx.user()["email"], "password": datagen.PASSWORD}
+    )
+    return response.status_code
+
+
+async def refresh(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    response = await client.post("/api/v1/user/tokens/refresh", headers={"refresh": tokens["refresh"]})
+    if response.status_code == 200:
+        tokens["access"], tokens["refresh"] = response.json()["access"], response.json()["refresh"]
+    return response.status_code
+
+
+async def create(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    user = ctx.user()
+    response = await client.post(
+        "/api/v1/task",
+        headers=ctx.auth(user),
+        json={
+            "name": "Новая задача",
+            "description": "Создана бенчмарком",
+            "owner_id": user["id"],
+            "subtasks": [{"name": "Первый шаг"}, {"name": "Второй шаг"}],
+        },
+    )
+    return response.status_code
+
+
+async def retrieve(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    user = ctx.user()
+    task_id = ctx.rng.choice(user["task_ids"])
+    response = await client.get(f"/api/v1/task/retrieve/{task_id}", headers=ctx.auth(user))
+    return response.status_code
+
+
+async def update(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    user = ctx.user()
+    response = await client.patch(
+        "/api/v1/task/update",
+        headers=ctx.auth(user),
+        json={"id": ctx.rng.choice(user["task_ids"]), "is_completed": ctx.rng.random() < 0.5},
+    )
+    return response.status_code
+
+
+async def list_tasks(client: httpx.AsyncClient, ctx: Context, tokens: dict) -> int:
+    user = ctx.user()
+    response = await client.get("/api/v1/task", headers=ctx.auth(user), params={"limit": 50})
+    return response.status_code
+
+
+SCENARIOS = {
+    "register": register,
+    "login": login,
+    "refresh": refresh,
+    "create": create,
+    "retrieve": retrieve,
+    "update": update,
+    "list": list_tasks,
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def run_scenario(client, ctx: Context, scenario, concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(tokens: dict):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await scenario(client, ctx, tokens)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    tokens = [await ctx.worker_tokens(index) for index in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(worker_tokens) for worker_tokens in tokens))
+    elapsed = time.perf_counter() - start
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Регрессии относительно базового прогона: RPS ниже или p95 выше допуска"""
+    previous = {(row["scenario"], row["concurrency"]): row for row in baseline}
+    regressions = []
+    for row in results:
+        base = previous.get((row["scenario"], row["concurrency"]))
+        if base is None:
+            continue
+        if row["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']}@{row['concurrency']}: rps {base['rps']} -> {row['rps']}")
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}@{row['concurrency']}: p95 {base['p95_ms']} -> {row['p95_ms']} ms")
+    return regressions
+
+
+async def prepare(args) -> Context:
+    if args.fake_redis:
+        import fakeredis
+
+        redis_client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        await redis_client.redis_startup()
+    async with db_helper.async_session_factory() as session:
+        await datagen.reset(session)
+        users = await datagen.generate(
+            session, args.users, args.tasks_per_user, args.subtasks_per_task, args.seed
+        )
+    for user in users:
+        user["access"], user["refresh"] = await create_tokens({"id": user["id"], "email": user["email"]})
+    return Context(users, args.seed)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий и уровень")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks-per-user", type=int, default=20)
+    parser.add_argument("--subtasks-per-task", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fake-redis", action="store_true")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    ctx = await prepare(args)
+    results = []
+    transport = httpx.ASGITransport(app=main_app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios.split(","):
+                for concurrency in (int(level) for level in args.concurrency.split(",")):
+                    row = {"scenario": name, "concurrency": concurrency}
+                    row.update(await run_scenario(client, ctx, SCENARIOS[name], concurrency, args.requests))
+                    print(row)
+                    results.append(row)
+    finally:
+        async with db_helper.async_session_factory() as session:
+            await datagen.reset(session)
+        await db_helper.dispose()
+        if not args.fake_redis:
+            await redis_client.redis_shutdown()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "users": args.users,
+            "tasks_per_user": args.tasks_per_user,
+            "requests": args.requests,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
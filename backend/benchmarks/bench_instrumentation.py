@@ -0,0 +1,70 @@
+"""
+Микробенчмарк накладных расходов MetricsMiddleware: один и тот же маршрут
+вызывается напрямую через ASGI с middleware и без него.
+
+Запуск из папки backend: python benchmarks/bench_instrumentation.py --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+import _setup  # noqa: F401
+from fastapi import FastAPI
+from instrumentation import MetricsMiddleware
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v1/task/retrieve/{task_id}")
+    async def retrieve(task_id: str):
+        return {"id": task_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def run(instrumented: bool, requests: int) -> dict:
+    app = build_app(instrumented)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/v1/task/retrieve/42",
+        "raw_path": b"/v1/task/retrieve/42",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - start
+    return {"instrumented": instrumented, "us_per_request": round(elapsed / requests * 1_000_000, 2)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    results = [await run(instrumented, args.requests) for instrumented in (False, True)]
+    for result in results:
+        print(result)
+    print({"overhead_us": round(results[1]["us_per_request"] - results[0]["us_per_request"], 2)})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Бенчмарк очереди фоновой генерации подзадач: постановка заданий и их разбор
+пачками разного размера (без модели и бд, измеряется только очередь).
+
+По умолчанию используется fakeredis, с --redis-url - настоящий локальный redis.
+
+Запуск из папки backend: python benchmarks/bench_jobs.py --jobs 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import _setup  # noqa: F401
+import redis_client
+from ai.jobs import SubtaskJobQueue
+from config import settings
+
+
+async def run(jobs: int, batch_size: int) -> dict:
+    queue = SubtaskJobQueue(settings.jobs, prefix=f"bench:{uuid.uuid4().hex}")
+    ids = [str(uuid.uuid4()) for _ in range(jobs)]
+
+    start = time.perf_counter()
+    for job_id in ids:
+        await queue.enqueue(job_id, "Купить продукты", "bench")
+    # повторная постановка не создаёт новых заданий
+    for job_id in ids[:100]:
+        await queue.enqueue(job_id, "Купить продукты", "bench")
+    enqueue_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processed = 0
+    while batch := await queue.pop_batch(batch_size):
+        await queue.complete({job["id"]: ["Молоко", "Хлеб"] for job in batch})
+        processed += len(batch)
+    process_elapsed = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "enqueue_per_sec": round(jobs / enqueue_elapsed),
+        "processed": processed,
+        "process_per_sec": round(processed / process_elapsed),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    if args.redis_url:
+        from redis.asyncio import Redis
+
+        redis_client.redis = Redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        from fakeredis.aioredis import FakeRedis
+
+        redis_client.redis = FakeRedis(decode_responses=True)
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        print(await run(args.jobs, batch_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
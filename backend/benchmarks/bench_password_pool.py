@@ -0,0 +1,122 @@
+"""
+Бенчмарк логинов: пропускная способность /user/login и задержка запросов
+/task/retrieve, которые идут параллельно с логинами. Приложение вызывается
+через httpx.ASGITransport в одном процессе, данные готовит datagen.py.
+Нужен postgres из BACKEND__DATABASE__URL, redis - настоящий или fakeredis (--fake-redis).
+
+Сравниваются два режима:
+    inline - bcrypt прямо в event loop (как было раньше),
+    pool   - bcrypt через PasswordHasher.
+
+Запуск из папки backend: python benchmarks/bench_password_pool.py --logins 64 --fake-redis
+"""
+import argparse
+import asyncio
+import time
+
+import _setup  # noqa: F401
+import httpx
+import auth
+import datagen
+import redis_client
+from database import db_helper
+from main import main_app
+from password_hasher import PasswordHasher, pwd_context
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class InlineHasher:
+    """Проверка пароля прямо в event loop, как до PasswordHasher"""
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return pwd_context.verify(password, hashed_password)
+
+    def shutdown(self):
+        pass
+
+
+async def retrieve_loop(client: httpx.AsyncClient, user: dict, stop: asyncio.Event, latencies: list[float]):
+    headers = {"Authorization": f"Bearer {user['access']}"}
+    index = 0
+    while not stop.is_set():
+        task_id = user["task_ids"][index % len(user["task_ids"])]
+        index += 1
+        start = time.perf_counter()
+        response = await client.get(f"/api/v1/task/retrieve/{task_id}", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+
+async def run(client: httpx.AsyncClient, user: dict, mode: str, args) -> dict:
+    hasher = InlineHasher() if mode == "inline" else PasswordHasher(workers=args.workers)
+    auth.password_hasher = hasher
+    login_errors = 0
+
+    async def login():
+        nonlocal login_errors
+        response = await client.post(
+            "/api/v1/user/login", json={"email": user["email"], "password": datagen.PASSWORD}
+        )
+        if response.status_code != 200:
+            login_errors += 1
+
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    readers = [
+        asyncio.create_task(retrieve_loop(client, user, stop, latencies)) for _ in range(args.readers)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*readers)
+    hasher.shutdown()
+    return {
+        "mode": mode,
+        "logins_per_sec": round(args.logins / elapsed, 1),
+        "login_errors": login_errors,
+        "retrieve_requests": len(latencies),
+        "retrieve_p50_ms": round(percentile(latencies, 0.5), 2),
+        "retrieve_p99_ms": round(percentile(latencies, 0.99), 2),
+        "retrieve_max_ms": round(max(latencies), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8, help="параллельных клиентов /task/retrieve")
+    parser.add_argument("--fake-redis", action="store_true")
+    args = parser.parse_args()
+
+    if args.fake_redis:
+        import fakeredis
+
+        redis_client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        await redis_client.redis_startup()
+    original_hasher = auth.password_hasher
+    try:
+        async with db_helper.async_session_factory() as session:
+            await datagen.reset(session)
+            [user] = await datagen.generate(session, 1, 20, 3)
+        user["access"], _ = await auth.create_tokens({"id": user["id"], "email": user["email"]})
+        transport = httpx.ASGITransport(app=main_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for mode in ("inline", "pool"):
+                print(await run(client, user, mode, args))
+    finally:
+        auth.password_hasher = original_hasher
+        async with db_helper.async_session_factory() as session:
+            await datagen.reset(session)
+        await db_helper.dispose()
+        if not args.fake_redis:
+            await redis_client.redis_shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Микробенчмарк сериализации задачи с подзадачами: jsonable_encoder по ORM объекту
+против заранее скомпилированной pydantic схемы.
+
+Запуск из папки backend: python benchmarks/bench_serialization.py --subtasks 200
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+
+import _setup  # noqa: F401
+from fastapi.encoders import jsonable_encoder
+from api.schemas import TaskDetailRead
+from models import SubTask, Task
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+def build_task(subtasks: int) -> Task:
+    now = datetime.now()
+    task_id = uuid.uuid4()
+    task = Task(
+        id=task_id,
+        owner_id=uuid.uuid4(),
+        name="Подготовить релиз",
+        description="Собрать изменения и выкатить",
+        is_public=True,
+        is_completed=False,
+        created_at=now,
+        updated_at=now,
+    )
+    # как после selectinload: без обратной ссылки parent, иначе jsonable_encoder зациклится
+    set_committed_value(
+        task,
+        "subtasks",
+        [
+            SubTask(
+                id=uuid.uuid4(),
+                parent_id=task_id,
+                name=f"Подзадача {i}",
+                is_completed=i % 2 == 0,
+                created_at=now,
+                updated_at=now,
+            )
+            for i in range(subtasks)
+        ],
+    )
+    return task
+
+
+def measure(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subtasks", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    task = build_task(args.subtasks)
+    results = {
+        "jsonable_encoder": measure(lambda: json.dumps(jsonable_encoder(task)), args.repeats),
+        "pydantic_schema": measure(lambda: TaskDetailRead.model_validate(task).model_dump_json(), args.repeats),
+    }
+    for name, us in results.items():
+        print({"serializer": name, "subtasks": args.subtasks, "us_per_response": round(us, 1)})
+
+
+if __name__ == "__main__":
+    main()
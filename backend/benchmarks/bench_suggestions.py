@@ -0,0 +1,91 @@
+"""
+Бенчмарк подсказок подзадач: пропускная способность (подсказок/сек) и p95 задержки
+при разных размерах пачки динамического батчинга.
+
+Нужны torch и transformers. Для быстрой проверки подойдёт маленький чекпоинт,
+например hf-internal-testing/tiny-random-t5 или google/flan-t5-small.
+
+Запуск из папки backend:
+    python benchmarks/bench_suggestions.py --model google/flan-t5-small --requests 128
+"""
+import argparse
+import asyncio
+import time
+
+import _setup  # noqa: F401
+from ai.service import SuggestionService
+from config import settings
+
+NAMES = [
+    "Купить продукты",
+    "Подготовить отчёт",
+    "Убраться в квартире",
+    "Собрать вещи в отпуск",
+    "Записаться к врачу",
+    "Починить велосипед",
+    "Выучить английский",
+    "Организовать день рождения",
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(service: SuggestionService, requests: int) -> tuple[float, float]:
+    latencies = []
+
+    async def one(index: int):
+        start = time.perf_counter()
+        # мимо кеша подсказок: измеряется только модель и батчинг
+        await service._predict(f"{NAMES[index % len(NAMES)]} {index}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, percentile(latencies, 0.95)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--max-wait-ms", type=int, default=10)
+    args = parser.parse_args()
+
+    model = None
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        config = settings.ai.model_copy(
+            update={
+                "model_path": args.model,
+                "max_batch_size": batch_size,
+                "max_wait_ms": args.max_wait_ms,
+                "max_queue_size": args.requests,
+            }
+        )
+        service = SuggestionService(config)
+        if model is not None:
+            # модель грузится один раз, меняются только параметры батчинга
+            service.model = model
+            model.config = config
+        await service.start()
+        model = service.model
+        await run(service, min(args.requests, batch_size * 2))
+        service.batches = service.batched_items = 0
+        throughput, p95 = await run(service, args.requests)
+        print(
+            {
+                "batch_size": batch_size,
+                "suggestions_per_sec": round(throughput, 1),
+                "p95_ms": round(p95, 1),
+                "avg_batch_size": round(service.stats()["avg_batch_size"], 1),
+            }
+        )
+        await service.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""
+Микробенчмарк проверки access токена в api_key_header с кешем токенов и без него.
+
+Запуск из папки backend: python benchmarks/bench_token_cache.py --requests 100000
+"""
+import argparse
+import asyncio
+import time
+
+import _setup  # noqa: F401
+import auth
+from token_cache import TokenCache
+
+
+async def run(cache_size: int, requests: int) -> dict:
+    auth.token_cache = TokenCache(max_size=cache_size)
+    token = auth.jwt.encode(
+        {"id": "bench", "email": "bench@example.com", "type": "access", "exp": int(time.time()) + 3600},
+        auth.SECRET_KEY,
+        algorithm=auth.ALGORITHM,
+    )
+    header = f"Bearer {token}"
+    start = time.perf_counter()
+    for _ in range(requests):
+        await auth.api_key_header(header)
+    elapsed = time.perf_counter() - start
+    return {
+        "cache_size": cache_size,
+        "us_per_request": round(elapsed / requests * 1_000_000, 2),
+        **auth.token_cache.stats(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+    for cache_size in (0, 10_000):
+        print(await run(cache_size, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
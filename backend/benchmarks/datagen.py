@@ -0,0 +1,123 @@
+"""
+Генератор синтетических данных для нагрузочных бенчмарков: пользователи, задачи
+и подзадачи с фиксированным seed, вставка пачками через INSERT ... VALUES.
+У всех пользователей один пароль PASSWORD, почта bench-{seed}-{номер}@example.com.
+
+Запуск из папки backend: python benchmarks/datagen.py --users 1000 --tasks-per-user 50 --reset
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import _setup  # noqa: F401
+from pydantic import SecretStr
+from sqlalchemy import delete, insert
+from auth import hash_password
+from database import db_helper
+from models import SubTask, Task, User
+
+PASSWORD = "benchmark-password"
+EMAIL_DOMAIN = "example.com"
+CHUNK_SIZE = 1000
+
+WORDS = ["купить", "молоко", "позвонить", "маме", "отчёт", "сдать", "проект", "встреча", "врач", "оплатить", "счёт", "ремонт"]
+
+
+def bench_email(seed: int, index: int) -> str:
+    return f"bench-{seed}-{index}@{EMAIL_DOMAIN}"
+
+
+def _phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+async def reset(session) -> None:
+    """Удаление всех ранее сгенерированных пользователей вместе с их задачами"""
+    await session.execute(delete(User).where(User.email.like(f"bench-%@{EMAIL_DOMAIN}")))
+    await session.commit()
+
+
+async def generate(
+    session,
+    users: int,
+    tasks_per_user: int,
+    subtasks_per_task: int,
+    seed: int = 42,
+) -> list[dict]:
+    """Создаёт данные и возвращает пользователей как [{"id", "email", "task_ids"}]"""
+    rng = random.Random(seed)
+    hashed_password = await hash_password(SecretStr(PASSWORD))
+    now = datetime.now(timezone.utc)
+    user_rows, task_rows, subtask_rows = [], [], []
+    task_ids: dict[uuid.UUID, list[str]] = {}
+    for index in range(users):
+        user_id = uuid.UUID(int=rng.getrandbits(128))
+        user_rows.append(
+            {
+                "id": user_id,
+                "email": bench_email(seed, index),
+                "name": "Тест",
+                "last_name": "Нагрузкин",
+                "hashed_password": hashed_password,
+            }
+        )
+        for _ in range(tasks_per_user):
+            task_id = uuid.UUID(int=rng.getrandbits(128))
+            task_ids.setdefault(user_id, []).append(str(task_id))
+            subtasks = [rng.random() < 0.3 for _ in range(rng.randint(0, subtasks_per_task * 2))]
+            task_rows.append(
+                {
+                    "id": task_id,
+                    "owner_id": user_id,
+                    "name": _phrase(rng, 2),
+                    "description": _phrase(rng, 6),
+                    "deadline": now + timedelta(hours=rng.randint(-72, 24 * 14)) if rng.random() < 0.5 else None,
+                    "is_public": rng.random() < 0.2,
+                    "is_completed": rng.random() < 0.3,
+                    "subtask_count": len(subtasks),
+                    "completed_subtask_count": sum(subtasks),
+                }
+            )
+            for is_completed in subtasks:
+                subtask_rows.append(
+                    {
+                        "id": uuid.UUID(int=rng.getrandbits(128)),
+                        "parent_id": task_id,
+                        "name": _phrase(rng, 2),
+                        "is_completed": is_completed,
+                    }
+                )
+    for model, rows in ((User, user_rows), (Task, task_rows), (SubTask, subtask_rows)):
+        for start in range(0, len(rows), CHUNK_SIZE):
+            await session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+    await session.commit()
+    return [
+        {"id": str(row["id"]), "email": row["email"], "task_ids": task_ids.get(row["id"], [])}
+        for row in user_rows
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tasks-per-user", type=int, default=20)
+    parser.add_argument("--subtasks-per-task", type=int, default=3, help="в среднем на задачу")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="удалить ранее сгенерированные данные")
+    args = parser.parse_args()
+    try:
+        async with db_helper.async_session_factory() as session:
+            if args.reset:
+                await reset(session)
+            users = await generate(
+                session, args.users, args.tasks_per_user, args.subtasks_per_task, args.seed
+            )
+    finally:
+        await db_helper.dispose()
+    print({"users": len(users), "tasks": len(users) * args.tasks_per_user})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Пакетные операции над задачами: результат должен совпадать с последовательным
+выполнением операций в порядке запроса.
+"""
+import pytest
+from sqlalchemy import event
+
+from database import db_helper
+from models import SubTask, Task
+
+pytestmark = pytest.mark.anyio
+
+
+async def bulk(client, headers, *operations):
+    response = await client.post("/api/v1/task/bulk", headers=headers, json={"operations": list(operations)})
+    assert response.status_code == 200
+    return [result["status"] for result in response.json()["results"]]
+
+
+async def test_last_toggle_of_subtask_wins(client, data):
+    subtask = data["tasks"][0].subtasks[0]
+    toggles = [{"op": "toggle_subtask", "id": str(subtask.id), "is_completed": value} for value in (True, False, True)]
+
+    assert await bulk(client, data["headers"], *toggles) == [200, 200, 200]
+
+    async with db_helper.async_session_factory() as session:
+        assert (await session.get(SubTask, subtask.id)).is_completed is True
+        assert (await session.get(Task, subtask.parent_id)).completed_subtask_count == 2
+
+
+async def test_bulk_does_not_touch_tasks_whose_owner_changed_after_check(client, data, engine):
+    moved, deleted = data["tasks"][0], data["tasks"][1]
+    other_id = data["other"].id.hex
+
+    def change_owner(conn, cursor, statement, parameters, context, executemany):
+        # владелец меняется между проверкой прав и первым изменением
+        if statement.startswith("UPDATE tasks") and not changed:
+            changed.append(True)
+            cursor.execute(
+                "UPDATE tasks SET owner_id = ? WHERE id IN (?, ?)", (other_id, moved.id.hex, deleted.id.hex)
+            )
+
+    changed: list[bool] = []
+    event.listen(engine.sync_engine, "before_cursor_execute", change_owner)
+    try:
+        await bulk(
+            client,
+            data["headers"],
+            {"op": "patch", "id": str(moved.id), "name": "Чужое имя"},
+            {"op": "toggle_subtask", "id": str(moved.subtasks[0].id), "is_completed": True},
+            {"op": "delete", "id": str(deleted.id)},
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", change_owner)
+
+    assert changed
+    async with db_helper.async_session_factory() as session:
+        task = await session.get(Task, moved.id)
+        assert (task.name, task.completed_subtask_count) == ("Купить молоко", 1)
+        assert (await session.get(SubTask, moved.subtasks[0].id)).is_completed is False
+        assert await session.get(Task, deleted.id) is not None
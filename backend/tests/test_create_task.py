@@ -0,0 +1,44 @@
+"""
+Создание задачи через POST /task и через /task/bulk сохраняет подзадачи одинаково.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from database import db_helper
+from models import SubTask, Task
+
+pytestmark = pytest.mark.anyio
+
+SUBTASKS = [{"name": "Первый шаг", "is_completed": True}, {"name": "Второй шаг"}]
+
+
+async def stored(task_id: str) -> tuple[Task, list[SubTask]]:
+    async with db_helper.async_session_factory() as session:
+        task = await session.get(Task, uuid.UUID(task_id))
+        subtasks = await session.scalars(select(SubTask).where(SubTask.parent_id == task.id).order_by(SubTask.name))
+        return task, list(subtasks)
+
+
+async def test_create_and_bulk_create_keep_completed_subtasks(client, data):
+    created = await client.post(
+        "/api/v1/task",
+        headers=data["headers"],
+        json={"name": "Купить молоко", "description": None, "owner_id": str(data["owner"].id), "subtasks": SUBTASKS},
+    )
+    bulk = await client.post(
+        "/api/v1/task/bulk",
+        headers=data["headers"],
+        json={"operations": [{"op": "create", "name": "Купить молоко", "description": None, "subtasks": SUBTASKS}]},
+    )
+    assert created.status_code == 200
+    assert bulk.status_code == 200
+
+    for task_id in (created.json()["id"], bulk.json()["results"][0]["id"]):
+        task, subtasks = await stored(task_id)
+        assert (task.subtask_count, task.completed_subtask_count) == (2, 1)
+        assert [(subtask.name, subtask.is_completed) for subtask in subtasks] == [
+            ("Второй шаг", False),
+            ("Первый шаг", True),
+        ]
@@ -0,0 +1,135 @@
+"""
+Регрессионные тесты числа запросов к бд и загруженных строк для эндпоинтов:
+эндпоинт не должен начать загружать лишние связи или ходить в бд в цикле.
+"""
+import pytest
+
+from conftest import PASSWORD
+from models import SubTask, Task, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_list_is_one_query(client, data, queries):
+    response = await client.get("/api/v1/task", headers=data["headers"])
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 3
+    assert queries.count == 1
+    assert queries.rows(Task) == 3
+    assert queries.rows(SubTask) == 0
+
+
+async def test_search_is_one_query(client, data, queries):
+    response = await client.get("/api/v1/task/search", params={"q": "молоко"}, headers=data["headers"])
+    assert response.status_code == 200
+    assert {item["name"] for item in response.json()["items"]} == {"Купить молоко", "Купить хлеб"}
+    assert queries.count == 1
+    assert queries.rows(Task) == 2
+    assert queries.rows(SubTask) == 0
+
+
+async def test_due_is_one_query_per_bucket(client, data, queries):
+    response = await client.get("/api/v1/task/due", headers=data["headers"])
+    assert response.status_code == 200
+    assert [task["name"] for task in response.json()["overdue"]] == ["Купить молоко"]
+    assert queries.count == 2
+    assert queries.rows(Task) == 2
+    assert queries.rows(SubTask) == 0
+
+
+async def test_retrieve_miss_loads_subtasks_once_and_hit_skips_db(client, data, queries):
+    url = f"/api/v1/task/retrieve/{data['tasks'][0].id}"
+    response = await client.get(url, headers=data["headers"])
+    assert response.status_code == 200
+    assert len(response.json()["subtasks"]) == 2
+    assert queries.count == 2
+    assert queries.rows(Task) == 1
+    assert queries.rows(SubTask) == 2
+
+    queries.reset()
+    cached = await client.get(url, headers=data["headers"])
+    assert cached.json() == response.json()
+    assert queries.count == 0
+
+
+async def test_bulk_query_count_does_not_grow_with_operations(client, data, queries):
+    tasks = data["tasks"]
+    response = await client.post("/api/v1/task/bulk", headers=data["headers"], json={"operations": [
+        {"op": "create", "name": "Новая задача", "description": "первая", "subtasks": [{"name": "Шаг"}]},
+        {"op": "create", "name": "Другая задача", "description": "вторая", "subtasks": [{"name": "Шаг"}]},
+        {"op": "patch", "id": str(tasks[0].id), "name": "Первое имя"},
+        {"op": "patch", "id": str(tasks[1].id), "description": "другое описание"},
+        {"op": "toggle_subtask", "id": str(tasks[0].subtasks[0].id), "is_completed": True},
+        {"op": "toggle_subtask", "id": str(tasks[1].subtasks[0].id), "is_completed": True},
+        {"op": "delete", "id": str(tasks[2].id)},
+    ]})
+    assert response.status_code == 200
+    assert all(result["status"] < 400 for result in response.json()["results"])
+    # проверка владельца, insert задач, insert подзадач, update задач, update подзадач,
+    # update счётчиков, delete - по одному запросу на вид операции
+    assert queries.count == 7
+    assert queries.rows(Task) == 0
+    assert queries.rows(SubTask) == 0
+
+    from database import db_helper
+
+    async with db_helper.async_session_factory() as session:
+        first, second = await session.get(Task, tasks[0].id), await session.get(Task, tasks[1].id)
+        assert (first.name, first.description) == ("Первое имя", "в магазине")
+        assert (second.name, second.description) == ("Сдать отчёт", "другое описание")
+        assert (first.completed_subtask_count, second.completed_subtask_count) == (2, 2)
+        assert await session.get(Task, tasks[2].id) is None
+
+
+async def test_login_is_one_query(client, data, queries):
+    response = await client.post("/api/v1/user/login", json={"email": "owner@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+    assert queries.count == 1
+    assert queries.rows(User) == 1
+
+
+async def test_public_profile_counts_tasks_in_same_query(client, data, queries):
+    response = await client.get(f"/api/v1/user/{data['owner'].id}")
+    assert response.status_code == 200
+    assert response.json()["task_count"] == 3
+    assert queries.count == 1
+    assert queries.rows(User) == 1
+    assert queries.rows(Task) == 0
+
+
+async def test_update_profile_is_select_and_update(client, data, queries):
+    response = await client.patch("/api/v1/user/update", headers=data["headers"], json={"name": "Иван"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Иван"
+    assert queries.count == 2
+    assert queries.rows(User) == 1
+    assert queries.rows(Task) == 0
+
+
+async def test_update_confidential_is_select_and_update(client, data, queries):
+    response = await client.post(
+        "/api/v1/user/update/confidential",
+        headers=data["headers"],
+        json={"new_email": "new@example.com", "new_password": "new-password"},
+    )
+    assert response.status_code == 200
+    assert response.json()["email"] == "new@example.com"
+    assert queries.count == 2
+    assert queries.rows(User) == 1
+    assert queries.rows(Task) == 0
+
+
+async def test_verify_password_is_one_query(client, data, queries):
+    response = await client.post(
+        "/api/v1/user/verify-password", headers=data["headers"], params={"input_password": PASSWORD}
+    )
+    assert response.status_code == 200
+    assert queries.count == 1
+    assert queries.rows(User) == 1
+
+    queries.reset()
+    response = await client.post(
+        "/api/v1/user/verify-password", headers=data["headers"], params={"input_password": "wrong-password"}
+    )
+    assert response.status_code == 401
+    assert queries.count == 1
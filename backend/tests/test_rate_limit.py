@@ -0,0 +1,78 @@
+"""
+Ограничение частоты запросов с включённым лимитером (в остальных тестах он выключен).
+Клиент ASGITransport приходит с адреса 127.0.0.1, в тестах с прокси он и есть прокси.
+"""
+import pytest
+from starlette.requests import Request
+
+import rate_limit
+from config import RateLimit, RouteRateLimit, settings
+from conftest import PASSWORD
+from rate_limit import RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def limiter(monkeypatch, redis):
+    def configure(**update) -> RateLimiter:
+        config = settings.rate_limit.model_copy(update={"enabled": True, **update})
+        limiter = RateLimiter(config)
+        monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+        return limiter
+
+    return configure
+
+
+async def login(client, email: str, password: str = "wrong-password", forwarded: str | None = None):
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    return await client.post("/api/v1/user/login", json={"email": email, "password": password}, headers=headers)
+
+
+async def test_login_account_limit_blocks_only_that_account(client, data, limiter):
+    limiter()
+
+    statuses = [(await login(client, "owner@example.com")).status_code for _ in range(11)]
+
+    assert statuses == [401] * 10 + [429]
+    blocked = await login(client, "owner@example.com", PASSWORD)
+    assert blocked.status_code == 429
+    assert int(blocked.headers["Retry-After"]) > 0
+    assert (await login(client, "other@example.com", PASSWORD)).status_code == 200
+
+
+async def test_clients_behind_trusted_proxy_have_separate_ip_limits(client, data, limiter):
+    limiter(
+        trusted_proxies=["127.0.0.0/8"],
+        routes={"login": RouteRateLimit(ip=RateLimit(requests=2, window=60))},
+    )
+
+    statuses = [(await login(client, "owner@example.com", forwarded="203.0.113.7")).status_code for _ in range(3)]
+
+    assert statuses == [401, 401, 429]
+    other_client = await login(client, "owner@example.com", PASSWORD, forwarded="198.51.100.4")
+    assert other_client.status_code == 200
+
+
+async def test_forwarded_header_from_untrusted_peer_is_ignored(client, data, limiter):
+    limiter(routes={"login": RouteRateLimit(ip=RateLimit(requests=2, window=60))})
+
+    statuses = [
+        (await login(client, "owner@example.com", forwarded=f"203.0.113.{index}")).status_code
+        for index in range(3)
+    ]
+
+    assert statuses == [401, 401, 429]
+
+
+async def test_client_ip_skips_spoofed_and_proxy_hops(limiter):
+    proxied = limiter(trusted_proxies=["10.0.0.0/8", "127.0.0.1"])
+
+    def request(peer: str, forwarded: str | None = None) -> Request:
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+    assert proxied.client_ip(request("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+    assert proxied.client_ip(request("127.0.0.1", "1.2.3.4, 203.0.113.7, 10.0.0.5")) == "203.0.113.7"
+    assert proxied.client_ip(request("127.0.0.1", "10.0.0.6")) == "10.0.0.6"
+    assert proxied.client_ip(request("127.0.0.1")) == "127.0.0.1"
@@ -0,0 +1,69 @@
+"""
+Ротация и отзыв рефреш токенов: lua-скрипты из auth.py выполняются в fakeredis
+(через lupa), поэтому гонки проверяются на той же атомарности, что и в redis.
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from auth import create_tokens, sessions_key
+
+pytestmark = pytest.mark.anyio
+
+
+def user_data() -> dict:
+    return {"id": str(uuid.uuid4()), "email": f"{uuid.uuid4().hex[:8]}@example.com"}
+
+
+async def refresh(client, token: str):
+    return await client.post("/api/v1/user/tokens/refresh", headers={"refresh": token})
+
+
+async def test_concurrent_refresh_rotates_token_once(client):
+    _, token = await create_tokens(user_data())
+
+    responses = await asyncio.gather(*(refresh(client, token) for _ in range(10)))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] + [401] * 9
+    [rotated] = [response.json()["refresh"] for response in responses if response.status_code == 200]
+    assert (await refresh(client, rotated)).status_code == 200
+    assert (await refresh(client, token)).status_code == 401
+
+
+async def test_refresh_keeps_one_session_per_token(client, redis):
+    user = user_data()
+    _, token = await create_tokens(user)
+
+    response = await refresh(client, token)
+
+    assert response.status_code == 200
+    assert await redis.zcard(sessions_key(user["id"])) == 1
+
+
+async def test_logout_all_revokes_every_refresh_token(client, redis):
+    user, other = user_data(), user_data()
+    tokens = [await create_tokens(user) for _ in range(3)]
+    _, other_token = await create_tokens(other)
+
+    response = await client.post(
+        "/api/v1/user/logout/all", headers={"Authorization": f"Bearer {tokens[0][0]}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "revoked": 3}
+    for _, token in tokens:
+        assert (await refresh(client, token)).status_code == 401
+    assert not await redis.exists(sessions_key(user["id"]))
+    assert (await refresh(client, other_token)).status_code == 200
+
+
+async def test_logout_all_without_sessions_revokes_nothing(client):
+    access, _ = await create_tokens(user_data())
+    await client.post("/api/v1/user/logout/all", headers={"Authorization": f"Bearer {access}"})
+
+    response = await client.post("/api/v1/user/logout/all", headers={"Authorization": f"Bearer {access}"})
+
+    assert response.status_code == 200
+    assert response.json()["revoked"] == 0
@@ -0,0 +1,62 @@
+"""
+Перезапуск воркеров мастером без настоящих fork: waitpid и spawn подменяются.
+"""
+import pytest
+
+import runner
+from config import settings
+
+
+@pytest.fixture
+def master(monkeypatch):
+    config = settings.run.model_copy(
+        update={"workers": 1, "restart_backoff": 1, "restart_backoff_max": 3, "max_worker_crashes": 4}
+    )
+    master = runner.PreforkRunner(config, app=object())
+    spawned: list[int] = []
+    monkeypatch.setattr(master, "spawn", lambda: spawned.append(1))
+    master.spawned = spawned
+    return master
+
+
+def exit_worker(monkeypatch, master, code: int) -> None:
+    master.children[100] = 0.0
+    statuses = [(100, code << 8), (0, 0)]
+    monkeypatch.setattr(runner.os, "waitpid", lambda pid, options: statuses.pop(0))
+    master._reap()
+
+
+def test_worker_exited_after_max_requests_is_replaced_at_once(monkeypatch, master):
+    exit_worker(monkeypatch, master, 0)
+
+    assert master.spawned == [1]
+    assert not master.pending_spawns
+
+
+def test_crashed_workers_restart_with_growing_backoff_then_master_stops(monkeypatch, master):
+    monkeypatch.setattr(runner.time, "monotonic", lambda: 1000.0)
+
+    for _ in range(3):
+        exit_worker(monkeypatch, master, 3)
+
+    assert master.spawned == []
+    assert master.pending_spawns == [1001.0, 1002.0, 1003.0]
+    assert not master.stopping
+
+    exit_worker(monkeypatch, master, 1)
+
+    assert master.stopping and master.failed
+
+
+def test_old_crashes_leave_the_window(monkeypatch, master):
+    now = [1000.0]
+    monkeypatch.setattr(runner.time, "monotonic", lambda: now[0])
+
+    for _ in range(6):
+        exit_worker(monkeypatch, master, 3)
+        now[0] += master.config.crash_window
+    master._spawn_pending()
+
+    assert not master.stopping
+    assert len(master.crashes) == 2
+    assert len(master.spawned) == 6
@@ -0,0 +1,29 @@
+"""
+Очередь заданий генерации подзадач: статус из get() и из pub/sub одинаковой формы.
+"""
+import json
+
+import pytest
+
+from ai.jobs import SubtaskJobQueue
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_completed_status_is_published_with_subtask_list(redis):
+    jobs = SubtaskJobQueue(settings.jobs, prefix="test_jobs")
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(jobs.channel("job"))
+    await pubsub.get_message(timeout=1)
+
+    await jobs.enqueue("job", "Купить молоко", "owner")
+    [job] = await jobs.pop_batch(1)
+    await jobs.complete({job["id"]: ["Одеться", "Дойти до магазина"]})
+
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+    published = json.loads(message["data"])
+    stored = await jobs.get("job")
+    assert published == {"status": "done", "subtasks": ["Одеться", "Дойти до магазина"]}
+    assert stored["subtasks"] == published["subtasks"]
+    await pubsub.aclose()
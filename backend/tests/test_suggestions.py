@@ -0,0 +1,33 @@
+"""
+Подсказки подзадач без модели: приложение работает, эндпоинты отвечают 503.
+"""
+import pytest
+
+from ai.service import SuggestionService
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def broken_service(monkeypatch):
+    import api.task_router
+
+    def load():
+        raise OSError("no checkpoint")
+
+    service = SuggestionService(settings.ai.model_copy(update={"model_path": "/nonexistent/model"}))
+    monkeypatch.setattr(service.model, "load", load)
+    monkeypatch.setattr(api.task_router, "suggestion_service", service)
+    yield service
+    await service.stop()
+
+
+async def test_failed_model_load_leaves_service_unavailable(client, data, broken_service):
+    await broken_service.start()
+
+    assert not broken_service.is_ready
+    assert broken_service.stats()["load_failures"] == 1
+    for url in ("/api/v1/task/suggest-subtasks", "/api/v1/task/suggest-subtasks/stream"):
+        response = await client.post(url, headers=data["headers"], json={"name": "Купить молоко"})
+        assert response.status_code == 503